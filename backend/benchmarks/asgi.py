@@ -0,0 +1,174 @@
+"""
+Compares the WSGI and ASGI serving modes under concurrent quiz players
+
+Every player plays a full game of QUESTIONS_PER_PLAY questions through
+/quizzes, all players at once. In WSGI mode players are served by a pool
+of threads, as by a threaded WSGI server, and in ASGI mode by the event
+loop handing requests to the ASGI app threads. WSGI latencies leave out
+the time players wait for a free thread, while ASGI latencies include
+the time requests wait on the event loop, so compare their throughput.
+
+Usage (from the backend directory):
+    python -m benchmarks.asgi --players 1000 --threads 32 \
+        --database-uri postgres://trivia@localhost:5432/trivia_bench
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from models import db, Question
+from flaskr.asgi import WSGIToASGI
+from .common import create_bench_app, fill, summarize
+from .load import QUESTIONS_PER_PLAY
+
+
+def wsgi_player(client, category_id, latencies):
+    previous_questions_ids = []
+
+    for _ in range(QUESTIONS_PER_PLAY):
+        start = time.perf_counter()
+        response = client.post(
+            "/quizzes",
+            json={
+                "previous_questions_ids": previous_questions_ids,
+                "quiz_category_id": category_id,
+            },
+        )
+        latencies.append((time.perf_counter() - start) * 1000)
+        previous_questions_ids.append(response.get_json()["question"]["id"])
+
+
+async def asgi_request(asgi_app, path, payload):
+    body = json.dumps(payload).encode()
+    scope = {
+        "type": "http",
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": path,
+        "query_string": b"",
+        "headers": [(b"content-type", b"application/json")],
+    }
+    messages = [{"type": "http.request", "body": body}]
+    chunks = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            chunks.append(message["body"])
+
+    await asgi_app(scope, receive, send)
+    return json.loads(b"".join(chunks))
+
+
+async def asgi_player(asgi_app, category_id, latencies):
+    previous_questions_ids = []
+
+    for _ in range(QUESTIONS_PER_PLAY):
+        start = time.perf_counter()
+        view = await asgi_request(
+            asgi_app,
+            "/quizzes",
+            {
+                "previous_questions_ids": previous_questions_ids,
+                "quiz_category_id": category_id,
+            },
+        )
+        latencies.append((time.perf_counter() - start) * 1000)
+        previous_questions_ids.append(view["question"]["id"])
+
+
+def run_wsgi(app, players, threads):
+    latencies = []
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(threads) as executor:
+        for future in [
+            executor.submit(
+                wsgi_player, app.test_client(), category_id, latencies
+            )
+            for category_id in players
+        ]:
+            future.result()
+
+    return summarize(latencies, time.perf_counter() - start)
+
+
+def run_asgi(app, players, threads):
+    asgi_app = WSGIToASGI(app, max_threads=threads)
+    latencies = []
+
+    async def play():
+        await asyncio.gather(
+            *(
+                asgi_player(asgi_app, category_id, latencies)
+                for category_id in players
+            )
+        )
+
+    start = time.perf_counter()
+    asyncio.run(play())
+    asgi_app.executor.shutdown()
+
+    return summarize(latencies, time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--database-uri",
+        default="sqlite:///"
+        + os.path.join(tempfile.gettempdir(), "trivia_bench.db"),
+    )
+    parser.add_argument("--questions", type=int, default=10000)
+    parser.add_argument("--players", type=int, default=1000)
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=32,
+        help="Threads of the WSGI server and of the ASGI app",
+    )
+    args = parser.parse_args()
+
+    app = create_bench_app(
+        args.database_uri,
+        DB_POOL_SIZE=args.threads,
+        DB_MAX_OVERFLOW=0,
+    )
+    fill(args.questions)
+
+    category_ids = [
+        category_id
+        for category_id, in db.session.query(Question.category_id).distinct()
+    ]
+    players = [
+        category_ids[player % len(category_ids)]
+        for player in range(args.players)
+    ]
+    db.session.remove()
+
+    results = {
+        "database": db.get_engine(app).dialect.name,
+        "questions": args.questions,
+        "players": args.players,
+        "threads": args.threads,
+        "modes": {},
+    }
+
+    # Warm up in-memory indexes before measuring
+    app.test_client().post("/quizzes", json={"previous_questions_ids": []})
+
+    for mode, run in (("wsgi", run_wsgi), ("asgi", run_asgi)):
+        results["modes"][mode] = run(app, players, args.threads)
+
+    print(json.dumps(results, indent=4))
+
+
+if __name__ == "__main__":
+    main()
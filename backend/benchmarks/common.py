@@ -0,0 +1,274 @@
+import os
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+from sqlalchemy import event
+from models import db, Question, Category, bump_versions
+
+
+def create_bench_app(database_uri, **config):
+    """
+    Creates the trivia app on its own database for benchmarking
+
+    :param database_uri: URI of the database to be benchmarked
+    :param config: Extra settings passed to the app
+    :return: Flask app
+    """
+
+    from flaskr import create_app
+
+    config = {
+        "SQLALCHEMY_DATABASE_URI": database_uri,
+        "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+        **config,
+    }
+
+    with tempfile.NamedTemporaryFile(
+        "w", suffix=".py", delete=False
+    ) as config_file:
+        for key, value in config.items():
+            config_file.write(f"{key} = {value!r}\n")
+
+    try:
+        app = create_app(config_file.name)
+
+    finally:
+        os.remove(config_file.name)
+
+    db.create_all()
+    return app
+
+
+def words(rng, vocabulary, count):
+    return " ".join(rng.choice(vocabulary) for _ in range(count))
+
+
+def make_vocabulary(rng, size=5000):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return [
+        "".join(rng.choice(letters) for _ in range(rng.randint(3, 9)))
+        for _ in range(size)
+    ]
+
+
+def fill(questions, categories=6, seed=0, batch_size=10000, skew=0):
+    """
+    Fills the database with synthetic questions, topping up the ones
+    it already has, so runs at different scales share one database
+
+    :param questions: Number of questions
+    :param categories: Number of categories
+    :param seed: Seed of the random generator
+    :param batch_size: Number of questions per insert statement
+    :param skew: Exponent of the Zipf distribution of questions over
+        categories, the n-th category gets a share of 1 / n ** skew
+        [optional, default=0: uniform]
+    """
+
+    existing = Question.query.count()
+
+    if existing >= questions:
+        return
+
+    # Same database and scale make the same questions
+    rng = random.Random(seed + existing)
+    vocabulary = make_vocabulary(rng)
+
+    def categories_ids():
+        return [
+            category_id
+            for category_id, in db.session.query(Category.id)
+            .order_by(Category.id)
+            .limit(categories)
+        ]
+
+    # Reuse the existing categories, adding the missing ones only
+    missing = categories - len(categories_ids())
+
+    if missing > 0:
+        db.session.execute(
+            Category.__table__.insert(),
+            [
+                {"type": f"Category {i}"}
+                for i in range(categories - missing + 1, categories + 1)
+            ],
+        )
+
+    ids = categories_ids()
+    weights = [1 / rank**skew for rank in range(1, len(ids) + 1)]
+
+    for start in range(existing, questions, batch_size):
+        db.session.execute(
+            Question.__table__.insert(),
+            [
+                {
+                    "question": words(rng, vocabulary, rng.randint(6, 12))
+                    + "?",
+                    "answer": words(rng, vocabulary, rng.randint(1, 3)),
+                    "difficulty": rng.randint(1, 5),
+                    "category_id": category_id,
+                }
+                for category_id in rng.choices(
+                    ids,
+                    weights,
+                    k=min(batch_size, questions - start),
+                )
+            ],
+        )
+
+    db.session.commit()
+    bump_versions(Question.__tablename__, Category.__tablename__)
+
+
+def summarize(latencies, elapsed=None):
+    """
+    Summarizes latencies in milliseconds
+
+    :param latencies: Collection of latencies in milliseconds
+    :param elapsed: Wall time in seconds the latencies were recorded in
+        [optional, default=None: the sum of the latencies]
+    :return: dict of count, throughput and latency percentiles
+    """
+
+    latencies = sorted(latencies)
+
+    if not latencies:
+        return {"count": 0}
+
+    if elapsed is None:
+        elapsed = sum(latencies) / 1000
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))]
+
+    return {
+        "count": len(latencies),
+        "throughput_rps": len(latencies) / elapsed if elapsed else None,
+        "mean_ms": statistics.mean(latencies),
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+    }
+
+
+def measure(function, repeat):
+    """
+    Calls a function repeatedly and summarizes its latency
+
+    :return: dict of latency percentiles in milliseconds
+    """
+
+    latencies = []
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    return summarize(latencies)
+
+
+class Recorder:
+    """
+    Sends requests to the app and records the latency, status and
+    number of SQL queries of every request by endpoint
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.client = app.test_client()
+        self.adapter = app.url_map.bind("localhost")
+        self.engines = [
+            db.get_engine(app),
+            *app.extensions["read_replicas"].engines(),
+        ]
+        self.endpoints = {}
+        self._queries = 0
+
+        for engine in self.engines:
+            event.listen(engine, "before_cursor_execute", self._count)
+
+    def _count(self, *args):
+        self._queries += 1
+
+    def close(self):
+        for engine in self.engines:
+            event.remove(engine, "before_cursor_execute", self._count)
+
+    def send(self, method, path, label=None, **kwargs):
+        """
+        :param method: HTTP method
+        :param path: Path of the endpoint
+        :param label: Label recorded apart from the other requests
+            of the endpoint, after its rule [optional]
+        :param kwargs: Arguments of the test client request
+        :return: response
+        """
+
+        rule, _ = self.adapter.match(path, method, return_rule=True)
+        key = f"{method} {rule.rule}" + (f" ({label})" if label else "")
+        stats = self.endpoints.setdefault(
+            key,
+            {"latencies": [], "queries": 0, "errors": 0},
+        )
+
+        self._queries = 0
+        start = time.perf_counter()
+        response = self.client.open(path, method=method, **kwargs)
+        stats["latencies"].append((time.perf_counter() - start) * 1000)
+
+        # Every request starts on a fresh session, as with a real server
+        db.session.remove()
+
+        stats["queries"] += self._queries
+        stats["errors"] += response.status_code >= 400
+
+        return response
+
+    def report(self, elapsed):
+        """
+        :param elapsed: Wall time in seconds of all the requests
+        :return: dict of summaries by endpoint, and of all requests
+        """
+
+        latencies = [
+            latency
+            for stats in self.endpoints.values()
+            for latency in stats["latencies"]
+        ]
+
+        return {
+            "total": summarize(latencies, elapsed),
+            "endpoints": {
+                endpoint: {
+                    **summarize(stats["latencies"]),
+                    "queries_per_request": stats["queries"]
+                    / len(stats["latencies"]),
+                    "errors": stats["errors"],
+                }
+                for endpoint, stats in sorted(self.endpoints.items())
+            },
+        }
+
+
+def allocations(function):
+    """
+    Calls a function once, after a warm-up call, and traces its memory
+
+    :return: dict of the peak size in KiB allocated during the call
+    """
+
+    function()
+    tracemalloc.start()
+
+    try:
+        start, _ = tracemalloc.get_traced_memory()
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+
+    finally:
+        tracemalloc.stop()
+
+    return {"peak_kib": (peak - start) / 1024}
@@ -0,0 +1,89 @@
+"""
+Measures the throughput and memory of exporting questions as NDJSON
+
+Every export is streamed through GET /questions/export and consumed
+chunk by chunk, the way a client downloads it. Memory should stay flat
+as the number of exported questions grows.
+
+Usage (from the backend directory):
+    python -m benchmarks.export --questions 1000000 --sizes 10000 1000000 \
+        --database-uri postgres://trivia@localhost:5432/trivia_bench
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from models import db, Question
+from .common import create_bench_app, fill, allocations
+
+
+def export(client, max_id, compress):
+    headers = {"Accept-Encoding": "gzip"} if compress else {}
+    response = client.get(
+        "/questions/export",
+        query_string={"max_id": max_id},
+        headers=headers,
+        buffered=False,
+    )
+
+    try:
+        return sum(len(chunk) for chunk in response.response)
+
+    finally:
+        response.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--database-uri",
+        default="sqlite:///"
+        + os.path.join(tempfile.gettempdir(), "trivia_bench.db"),
+    )
+    parser.add_argument("--questions", type=int, default=200000)
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[10000, 200000],
+        help="Numbers of questions to be exported",
+    )
+    args = parser.parse_args()
+
+    app = create_bench_app(args.database_uri)
+    fill(args.questions)
+
+    ids = [
+        question_id
+        for question_id, in db.session.query(Question.id).order_by(Question.id)
+    ]
+    db.session.remove()
+    client = app.test_client()
+
+    results = {
+        "database": db.get_engine(app).dialect.name,
+        "questions": len(ids),
+        "exports": {},
+    }
+
+    for size in args.sizes:
+        max_id = ids[min(size, len(ids)) - 1]
+
+        for compress in (False, True):
+            start = time.perf_counter()
+            length = export(client, max_id, compress)
+            elapsed = time.perf_counter() - start
+
+            results["exports"][f"{size}{' gzip' if compress else ''}"] = {
+                "bytes": length,
+                "questions_per_second": min(size, len(ids)) / elapsed,
+                **allocations(lambda: export(client, max_id, compress)),
+            }
+
+    print(json.dumps(results, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+"""
+Replays user scenarios against the trivia API and records every endpoint
+
+Scenarios:
+    browse: Lists categories, the first pages of a category, questions
+    deep_pagination: Jumps to far pages by offset and by cursor
+    search: Searches as typed, one request per typed character
+    quiz: Plays full games through /quizzes and through quiz sessions
+    review: Fetches questions for review one by one, then all at once
+
+Usage (from the backend directory):
+    python -m benchmarks.load --questions 1000000 --categories 20 \
+        --skew 1.1 --output results.json \
+        --database-uri postgres://trivia@localhost:5432/trivia_bench
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from models import db, Question, Category
+from flaskr.explain import check_plans
+from .common import create_bench_app, fill, Recorder
+
+# Questions played in a game by the frontend
+QUESTIONS_PER_PLAY = 5
+
+# Questions fetched at once by the review tooling
+QUESTIONS_PER_REVIEW = 20
+
+
+def browse(recorder, rng, data):
+    recorder.send("GET", "/categories")
+    category_id = rng.choice(data["categories"])
+
+    for page in range(1, 4):
+        recorder.send(
+            "GET",
+            f"/categories/{category_id}/questions",
+            query_string={"page": page},
+        )
+
+    recorder.send("GET", "/questions", query_string={"page": 1})
+    recorder.send("GET", f"/questions/{rng.choice(data['questions'])}")
+
+
+def deep_pagination(recorder, rng, data):
+    length = 10
+    last_page = max(1, data["total"] // length)
+    page = rng.randint(max(1, last_page // 2), last_page)
+
+    recorder.send(
+        "GET", "/questions", query_string={"page": page, "length": length}
+    )
+
+    # Follow the cursor for a few pages from the same position
+    cursor = rng.choice(data["questions"])
+
+    for _ in range(3):
+        response = recorder.send(
+            "GET",
+            "/questions",
+            query_string={"after": cursor, "length": length},
+        )
+        cursor = response.get_json().get("next_cursor")
+
+        if cursor is None:
+            break
+
+
+def search(recorder, rng, data):
+    word = rng.choice(data["words"])
+
+    # Terms sent by the frontend while typing a word
+    for length in range(3, len(word) + 1):
+        recorder.send(
+            "POST", "/questions", json={"search_term": word[:length]}
+        )
+
+
+def quiz(recorder, rng, data):
+    category_id = rng.choice([None] + data["categories"])
+    previous_questions_ids = []
+
+    for _ in range(QUESTIONS_PER_PLAY):
+        question = (
+            recorder.send(
+                "POST",
+                "/quizzes",
+                json={
+                    "previous_questions_ids": previous_questions_ids,
+                    "quiz_category_id": category_id,
+                },
+            )
+            .get_json()
+            .get("question")
+        )
+
+        if not question:
+            break
+
+        previous_questions_ids.append(question["id"])
+
+    session_id = (
+        recorder.send(
+            "POST", "/quizzes/sessions", json={"quiz_category_id": category_id}
+        )
+        .get_json()
+        .get("session_id")
+    )
+
+    for _ in range(QUESTIONS_PER_PLAY):
+        question = (
+            recorder.send("POST", f"/quizzes/sessions/{session_id}/next")
+            .get_json()
+            .get("question")
+        )
+
+        if not question:
+            break
+
+
+def review(recorder, rng, data):
+    ids = rng.sample(data["questions"], QUESTIONS_PER_REVIEW)
+
+    for question_id in ids:
+        recorder.send("GET", f"/questions/{question_id}")
+
+    recorder.send(
+        "GET",
+        "/questions",
+        label="ids",
+        query_string={"ids": ",".join(map(str, ids))},
+    )
+
+
+SCENARIOS = {
+    "browse": browse,
+    "deep_pagination": deep_pagination,
+    "search": search,
+    "quiz": quiz,
+    "review": review,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--database-uri",
+        default="sqlite:///"
+        + os.path.join(tempfile.gettempdir(), "trivia_bench.db"),
+    )
+    parser.add_argument("--questions", type=int, default=10000)
+    parser.add_argument("--categories", type=int, default=6)
+    parser.add_argument(
+        "--skew",
+        type=float,
+        default=0,
+        help="Zipf exponent of category sizes (0 for uniform)",
+    )
+    parser.add_argument(
+        "--scenarios",
+        nargs="+",
+        choices=sorted(SCENARIOS),
+        default=sorted(SCENARIOS),
+    )
+    parser.add_argument(
+        "--iterations",
+        type=int,
+        default=50,
+        help="Runs of every scenario",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--config",
+        type=json.loads,
+        default={},
+        help='Settings of the app as JSON, for e.g., \'{"SEARCH_BACKEND": '
+        '"fulltext"}\'',
+    )
+    parser.add_argument(
+        "--output", help="File to write the results to (default: stdout)"
+    )
+    args = parser.parse_args()
+
+    app = create_bench_app(args.database_uri, **args.config)
+    fill(
+        args.questions,
+        categories=args.categories,
+        seed=args.seed,
+        skew=args.skew,
+    )
+
+    # Sample the data scenarios pick their requests from
+    rng = random.Random(args.seed)
+    sample = [
+        question_id
+        for question_id, in db.session.query(Question.id)
+        .order_by(Question.id)
+        .limit(10000)
+    ]
+    data = {
+        "categories": [
+            category_id
+            for category_id, in db.session.query(Category.id).order_by(
+                Category.id
+            )
+        ],
+        "questions": sample,
+        "total": Question.query.count(),
+        "words": [
+            word
+            for question, in db.session.query(Question.question).limit(200)
+            for word in question.strip("?").split()
+            if len(word) >= 3
+        ],
+    }
+    db.session.remove()
+
+    results = {
+        "environment": {
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "database": db.get_engine(app).dialect.name,
+        },
+        "settings": {
+            "questions": data["total"],
+            "categories": len(data["categories"]),
+            "skew": args.skew,
+            "iterations": args.iterations,
+            "seed": args.seed,
+            "config": args.config,
+        },
+        "scenarios": {},
+    }
+
+    for name in args.scenarios:
+        scenario = SCENARIOS[name]
+
+        # Warm up in-memory caches and indexes before recording
+        recorder = Recorder(app)
+        scenario(recorder, random.Random(args.seed), data)
+        recorder.close()
+
+        recorder = Recorder(app)
+        start = time.perf_counter()
+
+        for _ in range(args.iterations):
+            scenario(recorder, rng, data)
+
+        results["scenarios"][name] = recorder.report(
+            time.perf_counter() - start
+        )
+        recorder.close()
+
+    # Flag the endpoint queries the database can't serve from an index
+    with app.app_context():
+        results["plans"] = {
+            result["query"]: result["sequential_scans"]
+            for result in check_plans()
+        }
+
+    output = json.dumps(results, indent=4, sort_keys=True)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
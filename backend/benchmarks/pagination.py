@@ -0,0 +1,80 @@
+"""
+Compares offset and cursor pagination of the list endpoints
+
+Usage (from the backend directory):
+    python -m benchmarks.pagination --questions 200000 \
+        --database-uri postgres://trivia@localhost:5432/trivia_bench
+"""
+
+import argparse
+import json
+import os
+import tempfile
+from models import db, Question
+from .common import create_bench_app, fill, measure
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--database-uri",
+        default="sqlite:///"
+        + os.path.join(tempfile.gettempdir(), "trivia_bench.db"),
+    )
+    parser.add_argument("--questions", type=int, default=200000)
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 10000])
+    parser.add_argument("--page-length", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    app = create_bench_app(args.database_uri)
+    fill(args.questions)
+    client = app.test_client()
+
+    category_id = db.session.query(Question.category_id).first()[0]
+    endpoints = {
+        "/questions": Question.query,
+        f"/categories/{category_id}/questions": Question.query.filter(
+            Question.category_id == category_id
+        ),
+    }
+
+    results = {
+        "database": db.get_engine(app).dialect.name,
+        "questions": Question.query.count(),
+        "page_length": args.page_length,
+        "endpoints": {},
+    }
+
+    for path, query in endpoints.items():
+        results["endpoints"][path] = {}
+
+        for page in args.pages:
+            skipped = (page - 1) * args.page_length
+
+            # Cursor of the same page is the id of its previous question
+            cursor = (
+                query.order_by(Question.id)
+                .offset(skipped - 1)
+                .limit(1)
+                .value(Question.id)
+                if skipped
+                else 0
+            )
+
+            modes = {
+                "offset": {"page": page, "length": args.page_length},
+                "cursor": {"after": cursor, "length": args.page_length},
+            }
+
+            for mode, query_string in modes.items():
+                results["endpoints"][path][f"page {page} ({mode})"] = measure(
+                    lambda: client.get(path, query_string=query_string),
+                    args.repeat,
+                )
+
+    print(json.dumps(results, indent=4))
+
+
+if __name__ == "__main__":
+    main()
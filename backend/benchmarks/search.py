@@ -0,0 +1,78 @@
+"""
+Compares the latency of the search backends on synthetic questions
+
+Usage (from the backend directory):
+    python -m benchmarks.search --questions 1000000 \
+        --database-uri postgres://trivia@localhost:5432/trivia_bench
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+from itertools import cycle
+from models import db, Question
+from flaskr.search import create_search_backend
+from .common import create_bench_app, fill, measure
+
+
+def typed_prefixes(word):
+    # Terms sent by the frontend while typing a word
+    return [word[:length] for length in range(3, len(word) + 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--database-uri",
+        default="sqlite:///"
+        + os.path.join(tempfile.gettempdir(), "trivia_bench.db"),
+    )
+    parser.add_argument("--questions", type=int, default=1000000)
+    parser.add_argument("--terms", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--page-length", type=int, default=10)
+    args = parser.parse_args()
+
+    app = create_bench_app(args.database_uri)
+    fill(args.questions)
+
+    # Pick search words from the stored questions
+    rng = random.Random(0)
+    sample = [
+        question
+        for question, in db.session.query(Question.question).limit(1000)
+    ]
+    terms = [
+        prefix
+        for question in rng.sample(sample, min(args.terms, len(sample)))
+        for prefix in typed_prefixes(rng.choice(question.split()).strip("?"))
+    ]
+
+    dialect = db.get_engine(app).dialect.name
+    results = {
+        "database": dialect,
+        "questions": Question.query.count(),
+        "terms": len(terms),
+        "backends": {},
+    }
+
+    for name in ("like", "fulltext"):
+        backend = create_search_backend(name, dialect)
+
+        # Warm up in-process indexes before measuring
+        backend.search(terms[0], 0, args.page_length)
+
+        # Measure every search as typed, one term at a time
+        typed_terms = cycle(terms)
+        results["backends"][type(backend).__name__] = measure(
+            lambda: backend.search(next(typed_terms), 0, args.page_length),
+            args.repeat * len(terms),
+        )
+
+    print(json.dumps(results, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Compares building and serializing a large page of questions
+
+Usage (from the backend directory):
+    python -m benchmarks.serialization --questions 200000 --length 500 \
+        --database-uri postgres://trivia@localhost:5432/trivia_bench
+"""
+
+import argparse
+import json
+import os
+import tempfile
+from flask import json as flask_json
+from models import db, Question, Category
+from flaskr.helpers import format_collection, format_rows, with_category
+from flaskr.read_models import QUESTION_COLUMNS, fetch_page
+from flaskr.serializers import create_json_provider, orjson
+from .common import create_bench_app, fill, measure, allocations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--database-uri",
+        default="sqlite:///"
+        + os.path.join(tempfile.gettempdir(), "trivia_bench.db"),
+    )
+    parser.add_argument("--questions", type=int, default=200000)
+    parser.add_argument("--length", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    app = create_bench_app(args.database_uri)
+    fill(args.questions)
+
+    categories = {
+        category.id: category.format() for category in Category.query.all()
+    }
+
+    def orm_page():
+        db.session.remove()
+        questions = (
+            with_category(Question.query)
+            .order_by(Question.id)
+            .limit(args.length)
+            .all()
+        )
+        return format_collection(questions)
+
+    def rows_page():
+        db.session.remove()
+        rows = (
+            db.session.query(*QUESTION_COLUMNS)
+            .order_by(Question.id)
+            .limit(args.length)
+            .all()
+        )
+        return format_rows(rows, categories)
+
+    def records_page():
+        db.session.remove()
+        records, _ = fetch_page(0, args.length)
+        return format_rows(records, categories)
+
+    builders = {"orm": orm_page, "rows": rows_page, "records": records_page}
+    view = {"questions": records_page()}
+    providers = {"flask": flask_json.dumps}
+    providers["stdlib"] = create_json_provider("stdlib").dumps
+
+    if orjson is not None:
+        providers["orjson"] = create_json_provider("orjson").dumps
+
+    results = {
+        "database": db.get_engine(app).dialect.name,
+        "questions": Question.query.count(),
+        "length": args.length,
+        "building": {
+            name: {
+                **measure(build, args.repeat),
+                **allocations(build),
+            }
+            for name, build in builders.items()
+        },
+        "serializing": {
+            name: measure(lambda: dumps(view), args.repeat)
+            for name, dumps in providers.items()
+        },
+        "endpoint": measure(
+            lambda: app.test_client().get(
+                "/questions", query_string={"length": args.length}
+            ),
+            args.repeat,
+        ),
+    }
+
+    print(json.dumps(results, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,4 @@
 export VENV_SOURCE=env;
 source "$VENV_SOURCE/bin/activate";
-python manage.py db init;
-python manage.py db migrate;
 python manage.py db upgrade;
 python filldb.py;
\ No newline at end of file
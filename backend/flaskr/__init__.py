@@ -1,14 +1,33 @@
-import random
-from flask import Flask, request, json, jsonify, abort
+import io
+import secrets
+from flask import Flask, request, json, abort, stream_with_context
 from flask_cors import CORS
 from models import db, Question, Category
-
-
-def format_collection(collection):
-    return [item.format() for item in collection]
-
-
-def create_app(config_file):
+from .bulk import read_rows, import_questions
+from .caches import CategoryRegistry
+from .decks import DeckStore, ALL_CATEGORIES
+from .database import engine_options, configure_engine
+from .http_cache import ResponseCache
+from .instrumentation import Instrumentation
+from .mutations import mutate_questions
+from .helpers import (
+    format_by_ids,
+    format_collection,
+    format_rows,
+    int_arg,
+    parse_ids,
+    with_category,
+)
+from .read_models import fetch_by_ids, fetch_page, stream_records
+from .replicas import ReplicaRouter, read_engine, use_primary
+from .search import create_search_backend
+from .selection import QuestionIndex, turn_difficulty
+from .serializers import create_json_provider, jsonify, ndjson_chunks
+from .sessions import create_session_store
+from .snapshots import SnapshotIndex, SnapshotRefresher
+
+
+def create_app(config_file, config=None):
     # Create and configure the app
     app = Flask(__name__)
     try:
@@ -17,13 +36,159 @@ def create_app(config_file):
     except FileNotFoundError:
         app.config.from_mapping(
             SQLALCHEMY_DATABASE_URI="postgres://trivia@localhost:5432/trivia",
-            SQLALCHEMY_TRACK_MODIFICATIONS=True,
+            SQLALCHEMY_TRACK_MODIFICATIONS=False,
         )
 
+    # Override settings of the config file if provided
+    app.config.from_mapping(config or {})
+
+    # Set pool and timeouts of database connections,
+    # explicit SQLALCHEMY_ENGINE_OPTIONS take priority
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        **engine_options(
+            app.config["SQLALCHEMY_DATABASE_URI"],
+            pool_size=app.config.get("DB_POOL_SIZE"),
+            max_overflow=app.config.get("DB_MAX_OVERFLOW"),
+            pool_timeout=app.config.get("DB_POOL_TIMEOUT"),
+            pool_recycle=app.config.get("DB_POOL_RECYCLE"),
+            pool_pre_ping=app.config.get("DB_POOL_PRE_PING", False),
+            statement_timeout=app.config.get("DB_STATEMENT_TIMEOUT"),
+            pgbouncer=app.config.get("DB_PGBOUNCER", False),
+        ),
+        **app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {}),
+    }
+
+    # Set a bind of every read replica
+    replica_binds = {
+        f"replica_{number}": uri
+        for number, uri in enumerate(app.config.get("DB_REPLICAS", []), 1)
+    }
+    app.config["SQLALCHEMY_BINDS"] = {
+        **(app.config.get("SQLALCHEMY_BINDS") or {}),
+        **replica_binds,
+    }
+
     app.app_context().push()
 
     db.init_app(app=app)
 
+    replica_engines = {
+        name: db.get_engine(app, bind=name) for name in replica_binds
+    }
+
+    for engine in [db.get_engine(app), *replica_engines.values()]:
+        configure_engine(
+            engine,
+            statement_timeout=app.config.get("DB_STATEMENT_TIMEOUT"),
+            pgbouncer=app.config.get("DB_PGBOUNCER", False),
+        )
+
+    # Send reads of read-only requests to the replicas
+    read_replicas = ReplicaRouter(
+        app,
+        db.get_engine(app),
+        replica_engines,
+        health_interval=app.config.get("DB_REPLICA_HEALTH_INTERVAL", 5),
+        read_your_writes=app.config.get("DB_READ_YOUR_WRITES", 0),
+    )
+
+    # Keep categories in memory instead of fetching them on every request
+    category_registry = CategoryRegistry(
+        ttl=app.config.get("CATEGORY_CACHE_TTL")
+    )
+
+    # Set search backend of questions
+    search_backend = create_search_backend(
+        app.config.get("SEARCH_BACKEND", "like"),
+        dialect=db.get_engine(app).dialect.name,
+        ttl=app.config.get("SEARCH_INDEX_TTL"),
+        estimate_threshold=app.config.get("SEARCH_ESTIMATE_THRESHOLD"),
+    )
+
+    # Keep questions IDs per category in memory
+    # for drawing quiz questions and counting questions
+    snapshot_path = app.config.get("QUESTION_SNAPSHOT_PATH")
+
+    if snapshot_path:
+        # Map them from a snapshot file shared by every process,
+        # picking up the replaced file once per request, and rewrite it
+        # after questions are changed by this process
+        snapshot_refresher = SnapshotRefresher(
+            app,
+            snapshot_path,
+            interval=app.config.get("QUESTION_SNAPSHOT_REFRESH"),
+        )
+        question_index = SnapshotIndex(
+            snapshot_path, refresher=snapshot_refresher
+        )
+        app.before_request(question_index.check)
+
+        if app.config.get("QUESTION_SNAPSHOT_REFRESH"):
+            snapshot_refresher.start()
+
+    else:
+        question_index = QuestionIndex(
+            ttl=app.config.get("QUESTION_INDEX_TTL")
+        )
+
+    # Keep shuffled decks of questions IDs for drawing quiz questions,
+    # shared next to the snapshot file, if any, like the questions IDs
+    decks_path = app.config.get("QUIZ_DECKS_PATH")
+
+    if decks_path is None and snapshot_path:
+        decks_path = f"{snapshot_path}.decks"
+
+    quiz_decks = DeckStore(
+        question_index,
+        path=decks_path,
+        ttl=app.config.get("QUIZ_DECKS_TTL"),
+    )
+
+    # Set store of server-side quiz sessions
+    session_store = create_session_store(
+        app.config.get("QUIZ_SESSION_STORE", "memory"),
+        ttl=app.config.get("QUIZ_SESSION_TTL", 3600),
+        max_sessions=app.config.get("QUIZ_SESSION_MAX", 10000),
+        redis_url=app.config.get("QUIZ_SESSION_REDIS_URL"),
+    )
+
+    # Set serializer of JSON views
+    app.extensions["json_provider"] = create_json_provider(
+        app.config.get("JSON_PROVIDER", "auto"),
+        sort_keys=app.config["JSON_SORT_KEYS"],
+    )
+
+    # Record queries and timings of every request if enabled
+    if app.config.get("INSTRUMENTATION", False):
+        Instrumentation(
+            app,
+            db.get_engine(app),
+            replicas=read_replicas.engines(),
+            slow_request_ms=app.config.get("SLOW_REQUEST_MS"),
+        )
+
+    # Tag responses of read endpoints for conditional requests
+    # ETags are remembered until the caches reload the changes of other
+    # processes, and bodies aren't kept in memory longer than the caches
+    cache_ttls = [
+        ttl
+        for ttl in (
+            app.config.get("CATEGORY_CACHE_TTL"),
+            app.config.get("QUESTION_INDEX_TTL"),
+        )
+        if ttl is not None
+    ]
+    response_cache = ResponseCache(
+        app,
+        max_age=app.config.get("HTTP_CACHE_MAX_AGE", 0),
+        max_size=app.config.get("RESPONSE_CACHE_SIZE", 0),
+        caches={
+            Category.__tablename__: category_registry,
+            Question.__tablename__: question_index,
+        },
+        ttl=min(cache_ttls) if cache_ttls else None,
+    )
+
     # Set up CORS and allow '*' for origins
     cors = CORS(app=app, resources={r"/api/*": {"origins": "*"}})
 
@@ -53,9 +218,7 @@ def create_app(config_file):
 
         try:
 
-            return jsonify(
-                {"categories": format_collection(Category.query.all())}
-            )
+            return jsonify({"categories": category_registry.format()})
 
         except BaseException:
             abort(404)
@@ -75,7 +238,7 @@ def create_app(config_file):
 
         try:
             return jsonify(
-                {"category": Category.query.get(category_id).format()}
+                {"category": category_registry.get(category_id).format()}
             )
 
         except BaseException:
@@ -94,6 +257,7 @@ def create_app(config_file):
         (3) Arguments:
             - page=<integer: page_number> [optional, default=1]
             - length=<integer: items_per_page> [optional, default=10]
+            - after=<integer: question_id> [optional, cursor mode]
 
         :param category_id: To specify a category for its questions
 
@@ -101,7 +265,8 @@ def create_app(config_file):
                 "questions" [collection],
                 "total_questions" [item],
                 "categories" [collection],
-                "current_category" [item]
+                "current_category" [item],
+                "next_cursor" [item, in cursor mode]
         """
 
         # Set questions per page value
@@ -110,28 +275,86 @@ def create_app(config_file):
         # Set page number
         page = (int(request.args.get("page", 1)) - 1) * qpp
 
+        # Set cursor to start the page after a question id (cursor mode)
         try:
+            after = int_arg(request.args, "after")
 
-            # Fetch specific category by its id
-            category = Category.query.get(category_id)
+        except ValueError:
+            abort(422)
 
-            return jsonify(
-                {
-                    "questions": format_collection(
-                        category.questions.order_by(Question.id)
-                        .offset(page)
-                        .limit(qpp)
-                        .all()
-                    ),
-                    "total_questions": category.questions.count(),
-                    "categories": format_collection(Category.query.all()),
-                    "current_category": category.format(),
-                }
+        try:
+
+            # Get specific category by its id
+            category = category_registry.get(category_id)
+
+            # Fetch questions of a single page in this category
+            questions_to_show, next_cursor = fetch_page(
+                page, qpp, after, category_id=category.id
             )
 
+            view = {
+                "questions": format_rows(
+                    questions_to_show, category_registry.formatted()
+                ),
+                "total_questions": question_index.count(category.id),
+                "categories": category_registry.format(),
+                "current_category": category.format(),
+            }
+
+            if after is not None:
+                view["next_cursor"] = next_cursor
+
+            return jsonify(view)
+
         except BaseException:
             abort(404)
 
+    def fetch_question(question_id):
+        """
+        Fetches a question with its category, from the primary database
+        if the replica read from doesn't have it yet, as the questions
+        index is loaded from the primary database
+
+        :param question_id: To specify a question
+        :return: Question, or None if it doesn't exist
+        """
+
+        question = with_category(Question.query).get(question_id)
+
+        if question is None and read_engine() is not None:
+            with use_primary():
+                question = with_category(Question.query).get(question_id)
+
+        return question
+
+    def questions_by_ids(value):
+        """
+        Builds the view of many questions fetched at once by their IDs
+
+        :param value: Comma separated string or list of questions IDs
+        :return: JSON view for
+                "questions" [collection, in the order of the IDs,
+                    null for missing questions],
+                "missing_ids" [collection]
+        """
+
+        try:
+            questions_ids = parse_ids(value)
+
+        except ValueError:
+            abort(422)
+
+        if len(questions_ids) > app.config.get("BATCH_READ_MAX_IDS", 100):
+            abort(422)
+
+        questions, missing_ids = format_by_ids(
+            questions_ids,
+            fetch_by_ids(questions_ids),
+            category_registry.formatted(),
+        )
+
+        return jsonify({"questions": questions, "missing_ids": missing_ids})
+
     #  All Questions.
     #  ----------------------------------------------------------------
     @app.route("/questions", methods=["GET", "POST"])
@@ -139,6 +362,7 @@ def create_app(config_file):
         """
         (1) Creates endpoint for:
             - fetching all questions paginated
+            - fetching many questions at once by their IDs
             - Searching for questions by a keyword
             - Adding a new question
 
@@ -147,12 +371,21 @@ def create_app(config_file):
         (3) Arguments for GET, POST [in search state]:
             - page=<integer: page_number> [optional, default=1]
             - length=<integer: items_per_page> [optional, default=10]
+            - after=<integer: question_id> [optional, cursor mode, GET only]
+            - ids=<comma separated questions IDs> [optional, GET only,
+                to fetch these questions only]
 
         (4) Body for POST:
 
+            - fetch many questions at once by providing:
+                JSON Object {
+                    "ids": <array: questions IDs>
+                }
+
             - search for questions by providing:
                 JSON Object {
                     "search_term": <string: search_keyword>
+                    "search_answers": <boolean> [optional, default=false]
                 }
 
             - or add new question by providing:
@@ -167,7 +400,12 @@ def create_app(config_file):
                     "questions" [collection],
                     "total_questions" [item],
                     "categories" [collection],
-                    "current_category" [item]
+                    "current_category" [item],
+                    "next_cursor" [item, in cursor mode]
+
+        :return(GET, POST with IDs): JSON view for
+                    "questions" [collection, null for missing questions],
+                    "missing_ids" [collection]
 
         :return(POST):
             - in search state
@@ -191,23 +429,37 @@ def create_app(config_file):
         # Set page number
         page = (int(request.args.get("page", 1)) - 1) * qpp
 
+        # Set cursor to start the page after a question id (cursor mode)
+        try:
+            after = int_arg(request.args, "after")
+
+        except ValueError:
+            abort(422)
+
         if request.method == "GET":
 
+            # Fetch questions by their IDs at once if provided
+            if "ids" in request.args:
+                return questions_by_ids(request.args["ids"])
+
             try:
 
-                return jsonify(
-                    {
-                        "questions": format_collection(
-                            Question.query.order_by(Question.id)
-                            .offset(page)
-                            .limit(qpp)
-                            .all()
-                        ),
-                        "total_questions": Question.query.count(),
-                        "categories": format_collection(Category.query.all()),
-                        "current_category": "",
-                    }
-                )
+                # Fetch questions of a single page
+                questions_to_show, next_cursor = fetch_page(page, qpp, after)
+
+                view = {
+                    "questions": format_rows(
+                        questions_to_show, category_registry.formatted()
+                    ),
+                    "total_questions": question_index.total(),
+                    "categories": category_registry.format(),
+                    "current_category": "",
+                }
+
+                if after is not None:
+                    view["next_cursor"] = next_cursor
+
+                return jsonify(view)
 
             except BaseException:
                 abort(404)
@@ -223,32 +475,40 @@ def create_app(config_file):
             else:
                 abort(422)
 
+            # Fetch questions by their IDs at once if provided
+            if "ids" in data:
+                with read_replicas.reading():
+                    return questions_by_ids(data["ids"])
+
             # Get search term
             search_term = data.get("search_term")
 
             # Check if search term is provided
             if search_term:
 
-                # Fetch results
-                results = Question.query.filter(
-                    Question.question.ilike(f"%{search_term}%")
-                )
+                # Fetch results for a single page and their total number
+                with read_replicas.reading():
+                    results = search_backend.search(
+                        search_term,
+                        offset=page,
+                        limit=qpp,
+                        search_answers=bool(data.get("search_answers")),
+                    )
 
-                # Format results for a single page
-                results_to_show = results.offset(page).limit(qpp).all()
+                if results.questions:
 
-                if results_to_show:
+                    view = {
+                        "questions": format_collection(results.questions),
+                        "total_questions": results.total,
+                        "categories": category_registry.format(),
+                        "current_category": "",
+                    }
 
-                    return jsonify(
-                        {
-                            "questions": format_collection(results_to_show),
-                            "total_questions": len(results.all()),
-                            "categories": format_collection(
-                                Category.query.all()
-                            ),
-                            "current_category": "",
-                        }
-                    )
+                    # Flag totals estimated by the database planner
+                    if results.estimated:
+                        view["total_questions_estimated"] = True
+
+                    return jsonify(view)
 
                 else:
                     abort(404)
@@ -283,6 +543,214 @@ def create_app(config_file):
                     db.session.close()
                     abort(422)
 
+    #  Bulk Questions.
+    #  ----------------------------------------------------------------
+    @app.route("/questions/bulk", methods=["POST"])
+    def questions_bulk():
+        """
+        (1) Creates endpoint for adding many questions at once
+            by streaming them in JSON Lines or CSV
+
+        (2) Methods: POST
+
+        (3) Arguments:
+            - format=<string: jsonl|csv> [optional, default=by content type]
+            - batch_size=<integer: rows_per_batch> [optional, default=5000]
+
+        (4) Body:
+            - JSON Lines of JSON Objects {
+                "question": <string: question>
+                "answer": <string: answer>
+                "difficulty": <integer: difficulty_number>
+                "category_id": <integer: category_id>
+            }
+
+            - or CSV with a header row of
+                question,answer,difficulty,category_id
+
+        :return: JSON view for
+                "success_status" [boolean],
+                "inserted" [item],
+                "failed" [item],
+                "errors" [collection],
+                "message" [string]
+        """
+
+        # Set format of the body
+        input_format = request.args.get("format") or (
+            "csv" if request.mimetype == "text/csv" else "jsonl"
+        )
+
+        # Set number of rows validated and inserted at once
+        try:
+            batch_size = int(request.args.get("batch_size", 5000))
+
+        except ValueError:
+            abort(422)
+
+        # Batches of no rows would never insert anything
+        if batch_size < 1:
+            abort(422)
+
+        try:
+
+            # Read the body as a stream, not to load it all in memory
+            stream = io.TextIOWrapper(request.stream, encoding="utf-8")
+
+            report = import_questions(
+                read_rows(stream, input_format), batch_size=batch_size
+            )
+
+            return jsonify(
+                {
+                    "success_status": not report["failed"],
+                    **report,
+                    "message": "import operation has been done",
+                }
+            )
+
+        except BaseException:
+            db.session.rollback()
+            db.session.close()
+            abort(422)
+
+    #  Batch Mutations of Questions.
+    #  ----------------------------------------------------------------
+    @app.route("/questions/batch", methods=["POST"])
+    def questions_batch():
+        """
+        (1) Creates endpoint for deleting or re-categorizing many
+            questions at once, selected by their IDs and/or by filters,
+            in a single transaction
+
+        (2) Methods: POST
+
+        (3) Arguments: no arguments needed
+
+        (4) Body:
+            JSON Object {
+                "action": <string: delete|recategorize>
+                "ids": <array: questions IDs> [optional]
+                "filter": JSON Object {
+                    "category_id": <integer: category_id> [optional]
+                    "difficulty": <integer: difficulty_number> [optional]
+                    "min_id": <integer: question_id> [optional]
+                    "max_id": <integer: question_id> [optional]
+                } [optional, with ids or alone]
+                "to_category_id": <integer: category_id> [recategorize]
+                "dry_run": <boolean> [optional, default=false]
+            }
+
+        :return: JSON view for
+                "success_status" [boolean],
+                "action" [string],
+                "affected" [item, number of changed questions,
+                    or of matching questions in dry run],
+                "dry_run" [boolean],
+                "message" [string]
+        """
+
+        try:
+            # Load json data from response body
+            data = json.loads(request.data)
+
+            # Get IDs of the selected questions if provided
+            questions_ids = (
+                parse_ids(data["ids"]) if data.get("ids") is not None else None
+            )
+
+            report = mutate_questions(
+                data.get("action"),
+                ids=questions_ids,
+                filters=data.get("filter"),
+                to_category_id=data.get("to_category_id"),
+                dry_run=bool(data.get("dry_run")),
+            )
+
+        except BaseException:
+            db.session.rollback()
+            abort(422)
+
+        return jsonify(
+            {
+                "success_status": True,
+                **report,
+                "message": "batch operation has been done successfully",
+            }
+        )
+
+    #  Export Questions.
+    #  ----------------------------------------------------------------
+    @app.route("/questions/export")
+    def questions_export():
+        """
+        (1) Creates endpoint for exporting all questions ordered by id
+            as newline-delimited JSON, streamed while they're read
+
+        (2) Methods: GET
+
+        (3) Arguments:
+            - category_id=<integer: category_id> [optional]
+            - min_id=<integer: question_id> [optional]
+            - max_id=<integer: question_id> [optional]
+            - after=<integer: question_id> [optional, to resume an export
+                after the last question received]
+
+        (4) Headers:
+            - Accept-Encoding: gzip [optional, to gzip the stream]
+
+        :return: NDJSON stream of "question" [item] per line
+        """
+
+        # Set category and ranges of the exported questions IDs
+        try:
+            category_id = int_arg(request.args, "category_id")
+            after = int_arg(request.args, "after")
+            min_id = int_arg(request.args, "min_id")
+            max_id = int_arg(request.args, "max_id")
+
+        except ValueError:
+            abort(422)
+
+        if category_id is not None:
+            try:
+                category_id = category_registry.get(category_id).id
+
+            except BaseException:
+                abort(404)
+
+        batches = stream_records(
+            category_id=category_id,
+            after=after,
+            min_id=min_id,
+            max_id=max_id,
+            batch_size=app.config.get("EXPORT_BATCH_SIZE", 1000),
+        )
+
+        # Gzip the stream if the client accepts it
+        compress = "gzip" in request.accept_encodings
+
+        # Keep the request context, and its session, while streaming
+        response = app.response_class(
+            stream_with_context(
+                ndjson_chunks(
+                    (
+                        format_rows(batch, category_registry.formatted())
+                        for batch in batches
+                    ),
+                    app.extensions["json_provider"],
+                    compress=compress,
+                )
+            ),
+            mimetype="application/x-ndjson",
+        )
+
+        if compress:
+            response.headers["Content-Encoding"] = "gzip"
+
+        response.vary.add("Accept-Encoding")
+        return response
+
     #  One Question.
     #  ----------------------------------------------------------------
     @app.route("/questions/<int:question_id>", methods=["GET", "DELETE"])
@@ -306,33 +774,33 @@ def create_app(config_file):
             "message" [string]
         """
 
-        try:
+        if request.method == "DELETE":
 
-            # Fetch specific question by its id
-            question = Question.query.get(question_id)
+            try:
 
-            if request.method == "GET":
+                # Delete the question by a set-based statement,
+                # without fetching it first
+                report = mutate_questions("delete", ids=[question_id])
 
-                return jsonify({"question": question.format()})
+            except BaseException:
+                abort(422)
 
-            elif request.method == "DELETE":
+            if not report["affected"]:
+                abort(404)
 
-                try:
+            return jsonify(
+                {
+                    "success_status": True,
+                    "message": "deletion operation has been done successfully",
+                }
+            )
 
-                    # Commit delete Question
-                    question.delete()
+        try:
 
-                    return jsonify(
-                        {
-                            "success_status": True,
-                            "message": (
-                                "deletion operation has been done successfully"
-                            ),
-                        }
-                    )
+            # Fetch specific question by its id
+            question = with_category(Question.query).get(question_id)
 
-                except BaseException:
-                    abort(422)
+            return jsonify({"question": question.format()})
 
         except BaseException:
             abort(404)
@@ -355,6 +823,10 @@ def create_app(config_file):
             it'll make an end-game force
             by returning a false value within question
 
+            - By playing questions of a fixed difficulty, or of a ramp
+            of difficulties by turn, the last one being kept
+            for the next turns
+
             - Most of the game implementation is dependent on the front end
 
         (2) Methods: POST
@@ -365,6 +837,8 @@ def create_app(config_file):
             JSON Object {
                 "previous_questions_ids": <array>
                 "quiz_category_id": <integer: category_id>
+                "difficulty": <integer> [optional]
+                "ramp": <array of integers> [optional]
             }
 
 
@@ -388,71 +862,144 @@ def create_app(config_file):
             # Get category id
             quiz_category_id = data.get("quiz_category_id")
 
-            # Set force-end state to False
-            force_end = False
-
-            # Check for truth of provided category id to set force-end
+            # Check for truth of provided category id
             if quiz_category_id:
-                # Fetch specific category by its id
+                # Get specific category by its id
                 # to be selected for game
-                selected_category = Category.query.get(quiz_category_id)
+                quiz_category_id = category_registry.get(quiz_category_id).id
+
+            # Set difficulty of this turn, fixed or by the ramp
+            difficulty = turn_difficulty(
+                data.get("difficulty"),
+                data.get("ramp"),
+                len(previous_questions_ids or ()),
+            )
+
+            excluded_ids = set(previous_questions_ids or ())
 
-                # Set force-end mechanism
-                force_end = selected_category.questions.count() == len(
-                    previous_questions_ids
+            while True:
+                # Draw the next question of a shuffled deck of the category,
+                # or of all categories, and of the difficulty if any,
+                # that is not in previous_questions_ids
+                random_question_id = quiz_decks.draw(
+                    quiz_category_id, excluded_ids, difficulty
                 )
 
+                # Set force-end state if all questions were played
+                if random_question_id is None:
+                    return jsonify({"question": False})
+
+                random_question = fetch_question(random_question_id)
+
+                if random_question is not None:
+                    return jsonify({"question": random_question.format()})
+
+                # Draw again if the question was deleted meanwhile
+                excluded_ids.add(random_question_id)
+
+        except BaseException:
+            abort(422)
+
+    #  Quiz Sessions.
+    #  ----------------------------------------------------------------
+    @app.route("/quizzes/sessions", methods=["POST"])
+    def quiz_sessions():
+        """
+        (1) Creates endpoint for starting a quiz session on the server,
+            with its questions shuffled in advance, so the client
+            doesn't have to send the previous questions on every turn
+
+        (2) Methods: POST
+
+        (3) Arguments: no arguments needed
+
+        (4) Body [optional]:
+            JSON Object {
+                "quiz_category_id": <integer: category_id> [optional]
+            }
+
+        :return: JSON view for
+                "session_id" [item],
+                "total_questions" [item]
+        """
+
+        try:
+            # Load json data from response body if provided
+            data = json.loads(request.data) if request.data else {}
+
+            # Get category id
+            quiz_category_id = data.get("quiz_category_id")
+
+            # Set deck key of the provided category or of all categories
+            if quiz_category_id:
+                key = category_registry.get(quiz_category_id).id
+
             else:
-                # Set categories list if quiz_category_id not provided
-                categories_to_select = Category.query.all()
-
-                # Get categories of questions in previous_questions_ids
-                categories_in_pqil = [
-                    Question.query.get(qid).category
-                    for qid in previous_questions_ids
-                ]
-
-                # Count categories in previous_questions_ids list
-                categories_in_pqil_counter = {
-                    cat: categories_in_pqil.count(cat)
-                    for cat in categories_in_pqil
-                }
+                key = ALL_CATEGORIES
 
-                # Remove category from categories_to_select
-                # if its questions num in categories_in_pqil_counter
-                # is equal to its actual questions num
-                for cat in list(set(categories_in_pqil)):
-                    if cat.questions.count() == categories_in_pqil_counter.get(
-                        cat
-                    ):
-                        categories_to_select.remove(cat)
-
-                # Select random category from categories_to_select list
-                selected_category = random.choice(categories_to_select)
-
-            # Fetch a random question in the selected category for pre-playing
-            random_question = selected_category.questions.order_by(
-                db.func.random()
-            ).first()
-
-            # Avoid repeating the same question in the provided category
-            while (
-                random_question.id in previous_questions_ids and not force_end
-            ):
-                # Fetch a random question in the selected category
-                random_question = selected_category.questions.order_by(
-                    db.func.random()
-                ).first()
-
-            # Check for force-end state
-            if force_end:
-                return jsonify({"question": False})
-
-            return jsonify({"question": random_question.format()})
+            # Play a shared shuffled deck in an order of the session's own,
+            # instead of copying and shuffling the questions IDs
+            decks, generation = quiz_decks.current()
+            questions_ids = decks.get(key, ())
+
+            session_id = secrets.token_urlsafe(16)
+            session_store.create(
+                session_id, f"{generation}:{key}", questions_ids
+            )
+
+            return jsonify(
+                {
+                    "session_id": session_id,
+                    "total_questions": len(questions_ids),
+                }
+            )
 
         except BaseException:
             abort(422)
 
+    #  Next Question in a Quiz Session.
+    #  ----------------------------------------------------------------
+    @app.route("/quizzes/sessions/<session_id>/next", methods=["POST"])
+    def quiz_session_next(session_id):
+        """
+        (1) Creates endpoint for fetching the next question of a quiz session,
+            it'll make an end-game force by returning a false value
+            within question after the last question
+
+        (2) Methods: POST
+
+        (3) Arguments: no arguments needed
+
+        :param session_id: To specify a quiz session
+
+        :return:
+            - in infinite state
+                JSON view for
+                "question" [item]
+
+            - in force-end state
+                JSON view for
+                "question" [boolean: false]
+        """
+
+        try:
+            # Pop the next question id of the session
+            question_id = session_store.pop(session_id)
+
+        except KeyError:
+            abort(404)
+
+        # Skip questions deleted since the session started
+        while question_id is not None:
+            question = with_category(Question.query).get(question_id)
+
+            if question:
+                return jsonify({"question": question.format()})
+
+            question_id = session_store.pop(session_id)
+
+        return jsonify({"question": False})
+
     # ----------------------------------------------------------------------------#
     # Error Handlers.
     # ----------------------------------------------------------------------------#
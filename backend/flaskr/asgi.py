@@ -0,0 +1,211 @@
+import asyncio
+import io
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from . import create_app
+
+
+class WSGIToASGI:
+    """
+    Serves a WSGI app to ASGI servers, running every request in a bounded
+    pool of threads so the event loop keeps accepting connections while
+    requests wait on the database, and streaming response bodies
+    chunk by chunk
+    """
+
+    def __init__(self, wsgi_app, max_threads=32):
+        """
+        :param wsgi_app: WSGI app
+        :param max_threads: Max number of requests handled at once,
+            the others wait on the event loop [optional, default=32]
+        """
+
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(
+            max_threads, thread_name_prefix="trivia-asgi"
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self.lifespan(receive, send)
+
+        if scope["type"] != "http":
+            raise ValueError(f"Unsupported ASGI scope: {scope['type']}")
+
+        body = b""
+        more_body = True
+
+        while more_body:
+            message = await receive()
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+        loop = asyncio.get_running_loop()
+        messages = asyncio.Queue(maxsize=8)
+        closed = threading.Event()
+
+        def put(message):
+            # Wait for the event loop to take the message, so slow clients
+            # hold back streamed responses instead of piling them up
+            if not closed.is_set():
+                asyncio.run_coroutine_threadsafe(
+                    messages.put(message), loop
+                ).result()
+
+        task = loop.run_in_executor(
+            self.executor, self.handle, build_environ(scope, body), put, closed
+        )
+
+        try:
+            while True:
+                message = await messages.get()
+
+                if message is None:
+                    break
+
+                await send(message)
+
+        finally:
+            # Let the app thread finish if the client went away
+            closed.set()
+
+            while not messages.empty():
+                messages.get_nowait()
+
+        await task
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+
+            elif message["type"] == "lifespan.shutdown":
+                self.executor.shutdown(wait=True)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def handle(self, environ, put, closed):
+        """
+        Runs the WSGI app on a request, putting the ASGI messages of its
+        response while iterating its body, then None
+
+        :param environ: WSGI environ
+        :param put: Callable taking a message
+        :param closed: Event set to stop iterating the body
+        """
+
+        start = {"type": "http.response.start"}
+
+        def start_response(status, headers, exc_info=None):
+            start["status"] = int(status.split(" ", 1)[0])
+            start["headers"] = [
+                (name.lower().encode("latin1"), value.encode("latin1"))
+                for name, value in headers
+            ]
+
+        try:
+            result = self.wsgi_app(environ, start_response)
+
+            try:
+                # Hold a chunk back to flag the last one
+                body = None
+
+                for chunk in result:
+                    if closed.is_set():
+                        return
+
+                    if not chunk:
+                        continue
+
+                    if body is None:
+                        put(start)
+
+                    else:
+                        put(
+                            {
+                                "type": "http.response.body",
+                                "body": body,
+                                "more_body": True,
+                            }
+                        )
+
+                    body = chunk
+
+                if body is None:
+                    put(start)
+
+                put({"type": "http.response.body", "body": body or b""})
+
+            finally:
+                if hasattr(result, "close"):
+                    result.close()
+
+        finally:
+            put(None)
+
+
+def build_environ(scope, body):
+    """
+    Builds the WSGI environ of an ASGI HTTP request
+
+    :param scope: ASGI HTTP scope
+    :param body: Request body
+    :return: WSGI environ
+    """
+
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode().decode("latin1"),
+        "PATH_INFO": scope["path"].encode().decode("latin1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+
+    if scope.get("client"):
+        environ["REMOTE_ADDR"] = scope["client"][0]
+
+    for name, value in scope.get("headers", []):
+        name = name.decode("latin1").upper().replace("-", "_")
+        value = value.decode("latin1")
+
+        if name == "CONTENT_LENGTH":
+            continue
+
+        key = name if name == "CONTENT_TYPE" else f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+
+    return environ
+
+
+def create_asgi_app(config_file="development.py", config=None):
+    """
+    Creates the trivia app for ASGI servers, for e.g.,
+    uvicorn --factory flaskr.asgi:create_asgi_app
+
+    ASGI mode is selected by this entry point rather than by a setting
+    of create_app, which must keep returning the Flask app for flask run,
+    manage.py and the tests
+
+    :param config_file: Config file of the app, relative to the flaskr
+        package, the same as run.sh passes to create_app
+    :param config: Settings overriding the config file [optional]
+    :return: ASGI app
+    """
+
+    app = create_app(config_file, config)
+
+    return WSGIToASGI(app, max_threads=app.config.get("ASGI_MAX_THREADS", 32))
@@ -0,0 +1,169 @@
+import csv
+import io
+import json
+from itertools import islice
+from models import db, Question, Category, bump_versions
+
+COLUMNS = ["question", "answer", "difficulty", "category_id"]
+
+# Columns of integers, read from text in CSV
+INTEGER_COLUMNS = ["difficulty", "category_id"]
+
+
+def read_rows(stream, format):
+    """
+    Reads questions rows from a text stream one by one
+
+    :param stream: Text stream of JSON Lines or CSV with a header row
+    :param format: "jsonl" or "csv"
+    :return: iterator of (line number, row dict or parsing error)
+    """
+
+    if format == "csv":
+        reader = csv.DictReader(stream)
+
+        for row in reader:
+            # CSV has no types, integers are parsed from their text
+            for column in INTEGER_COLUMNS:
+                try:
+                    row[column] = int(row[column])
+
+                except (KeyError, TypeError, ValueError):
+                    pass
+
+            yield reader.line_num, row
+
+    elif format == "jsonl":
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+
+            try:
+                row = json.loads(line)
+
+            except ValueError as error:
+                yield line_number, ValueError(f"invalid JSON ({error})")
+                continue
+
+            if not isinstance(row, dict):
+                row = ValueError("a JSON object is expected")
+
+            yield line_number, row
+
+    else:
+        raise ValueError(f"Unknown format: {format}")
+
+
+def validate(row, categories_ids):
+    """
+    :return: row with the questions columns only
+    :raise ValueError: if the row isn't a valid question
+    """
+
+    for column in ("question", "answer"):
+        value = row.get(column)
+
+        if not isinstance(value, str) or not value.strip():
+            raise ValueError(f"{column} must be a non-empty string")
+
+    difficulty = row.get("difficulty")
+    category_id = row.get("category_id")
+
+    # Floats and booleans aren't taken for integers
+    for value in (difficulty, category_id):
+        if isinstance(value, bool) or not isinstance(value, int):
+            raise ValueError("difficulty and category_id must be integers")
+
+    if category_id not in categories_ids:
+        raise ValueError(f"category {category_id} doesn't exist")
+
+    return {
+        "question": row["question"],
+        "answer": row["answer"],
+        "difficulty": difficulty,
+        "category_id": category_id,
+    }
+
+
+def insert_batch(rows):
+    connection = db.session.connection()
+
+    # COPY is the fastest way to load rows into PostgreSQL
+    if connection.dialect.name == "postgresql":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+
+        for row in rows:
+            writer.writerow([row[column] for column in COLUMNS])
+
+        buffer.seek(0)
+
+        with connection.connection.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY {Question.__tablename__} ({', '.join(COLUMNS)}) "
+                "FROM STDIN WITH (FORMAT csv)",
+                buffer,
+            )
+
+    else:
+        connection.execute(Question.__table__.insert(), rows)
+
+
+def import_questions(rows, batch_size=5000, max_errors=1000):
+    """
+    Validates and inserts questions in batches, committing every batch
+
+    :param rows: Iterator of (line number, row dict or parsing error)
+    :param batch_size: Number of rows validated and inserted at once
+    :param max_errors: Max number of errors to be reported
+    :return: dict of
+        "inserted" [number of inserted questions],
+        "failed" [number of invalid rows],
+        "errors" [collection of {"line", "error"}]
+    :raise ValueError: If batch_size is less than 1
+    """
+
+    if batch_size < 1:
+        raise ValueError("batch_size must be at least 1")
+
+    rows = iter(rows)
+    categories_ids = {
+        category_id for category_id, in db.session.query(Category.id)
+    }
+    report = {"inserted": 0, "failed": 0, "errors": []}
+
+    try:
+        while True:
+            chunk = list(islice(rows, batch_size))
+
+            if not chunk:
+                break
+
+            batch = []
+
+            for line_number, row in chunk:
+                try:
+                    if isinstance(row, Exception):
+                        raise row
+
+                    batch.append(validate(row, categories_ids))
+
+                except ValueError as error:
+                    report["failed"] += 1
+
+                    if len(report["errors"]) < max_errors:
+                        report["errors"].append(
+                            {"line": line_number, "error": str(error)}
+                        )
+
+            if batch:
+                insert_batch(batch)
+                db.session.commit()
+                report["inserted"] += len(batch)
+
+    finally:
+        # Bulk inserts skip the ORM, so caches must reload the questions
+        if report["inserted"]:
+            bump_versions(Question.__tablename__)
+
+    return report
@@ -0,0 +1,132 @@
+import time
+from models import db, Category, versions, changes_since
+from .replicas import use_primary
+
+
+class TableCache:
+    """
+    Holds a value loaded from the database and reloads it lazily
+    when one of its tables has changed or when it outlives its ttl,
+    unless it can apply the changes of its table to the value
+    """
+
+    def __init__(self, loader, tables, ttl=None, apply=None):
+        """
+        :param loader: Callable returning the value to be cached
+        :param tables: Names of the tables the value is built from
+        :param ttl: Max age of the value in seconds [optional, default=None]
+        :param apply: Callable taking the value and a list of RowChange
+            of a single table, returning the changed value [optional]
+        """
+
+        self.loader = loader
+        self.tables = tuple(tables)
+        self.ttl = ttl
+        self.apply = apply
+        self._value = None
+        self._version = None
+        self._loaded_at = 0.0
+
+    def version(self):
+        return tuple(versions.get(table, 0) for table in self.tables)
+
+    def expired(self):
+        return (
+            self.ttl is not None
+            and time.monotonic() - self._loaded_at > self.ttl
+        )
+
+    def get(self):
+        # Take the version before loading, so any change committed
+        # while loading triggers another reload on the next call
+        version = self.version()
+
+        if version == self._version and not self.expired():
+            return self._value
+
+        changes = self.changes_until(version)
+
+        if changes is not None:
+            self._value = self.apply(self._value, changes)
+            self._version = version
+
+        else:
+            # Load from the primary, replicas may not have the changes yet
+            with use_primary():
+                self._value = self.loader()
+
+            self._version = version
+            self._loaded_at = time.monotonic()
+
+        return self._value
+
+    def generation(self):
+        """
+        :return: time the value was loaded, reloading it first if it's
+            outdated, so it changes whenever the value is reloaded
+        """
+
+        self.get()
+        return self._loaded_at
+
+    def changes_until(self, version):
+        # Changes can be applied to an unexpired value of a single table
+        if (
+            self.apply is None
+            or self._version is None
+            or len(self.tables) != 1
+            or self.expired()
+        ):
+            return None
+
+        return changes_since(self.tables[0], self._version[0], version[0])
+
+    def invalidate(self):
+        self._version = None
+
+
+class CategoryRegistry:
+    """
+    Keeps all categories in memory, reloaded whenever
+    the categories table changes or the ttl is over
+    """
+
+    def __init__(self, ttl=None):
+        self._cache = TableCache(
+            self._load, tables=[Category.__tablename__], ttl=ttl
+        )
+
+    @staticmethod
+    def _load():
+        categories = {}
+
+        # Build transient categories to be shared across sessions
+        for category_id, category_type in db.session.query(
+            Category.id, Category.type
+        ).order_by(Category.id):
+            category = Category(type=category_type)
+            category.id = category_id
+            categories[category_id] = category
+
+        formatted = {
+            category_id: category.format()
+            for category_id, category in categories.items()
+        }
+
+        return categories, list(formatted.values()), formatted
+
+    def generation(self):
+        return self._cache.generation()
+
+    def get(self, category_id):
+        return self._cache.get()[0].get(category_id)
+
+    def all(self):
+        return list(self._cache.get()[0].values())
+
+    def format(self):
+        return self._cache.get()[1]
+
+    def formatted(self):
+        # Formatted categories by their IDs
+        return self._cache.get()[2]
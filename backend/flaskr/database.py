@@ -0,0 +1,135 @@
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import QueuePool
+
+# Seconds the current thread spent waiting for pool connections
+checkout_waits = threading.local()
+
+
+class TimedQueuePool(QueuePool):
+    """
+    QueuePool adding the time spent checking out connections, including
+    waiting for a free one or opening a new one, to checkout_waits
+    """
+
+    def connect(self):
+        start = time.perf_counter()
+
+        try:
+            return super().connect()
+
+        finally:
+            checkout_waits.seconds = getattr(checkout_waits, "seconds", 0) + (
+                time.perf_counter() - start
+            )
+
+
+def engine_options(
+    database_uri,
+    pool_size=None,
+    max_overflow=None,
+    pool_timeout=None,
+    pool_recycle=None,
+    pool_pre_ping=False,
+    statement_timeout=None,
+    pgbouncer=False,
+):
+    """
+    Builds the options of the engine of the app
+
+    :param database_uri: URI of the database
+    :param pool_size: Number of connections kept open [optional]
+    :param max_overflow: Number of connections opened beyond pool_size
+        under load and closed when returned [optional]
+    :param pool_timeout: Seconds to wait for a free connection [optional]
+    :param pool_recycle: Max age in seconds of connections [optional]
+    :param pool_pre_ping: To test connections when checked out,
+        replacing the ones closed by the database [optional]
+    :param statement_timeout: Max duration in milliseconds of statements
+        [optional, default=None: no limit]
+    :param pgbouncer: To set PostgreSQL sessions per transaction,
+        since PgBouncer doesn't support startup options [optional]
+    :return: dict of create_engine options
+    """
+
+    url = make_url(database_uri)
+    options = {}
+
+    if url.get_backend_name() == "sqlite":
+        # SQLite opens a connection per checkout unless a pool size is set,
+        # and in memory it must keep its single connection
+        if not pool_size or url.database in (None, "", ":memory:"):
+            return options
+
+        # Pooled SQLite connections are shared by the request threads
+        options["connect_args"] = {"check_same_thread": False}
+
+    options["poolclass"] = TimedQueuePool
+
+    if pool_size is not None:
+        options["pool_size"] = pool_size
+
+    for name, value in (
+        ("max_overflow", max_overflow),
+        ("pool_timeout", pool_timeout),
+        ("pool_recycle", pool_recycle),
+    ):
+        if value is not None:
+            options[name] = value
+
+    if pool_pre_ping:
+        options["pool_pre_ping"] = True
+
+    if (
+        url.get_backend_name() == "postgresql"
+        and statement_timeout
+        and not pgbouncer
+    ):
+        # Set the timeout once per connection, without any extra query
+        options["connect_args"] = {
+            "options": f"-c statement_timeout={int(statement_timeout)}"
+        }
+
+    return options
+
+
+def configure_engine(engine, statement_timeout=None, pgbouncer=False):
+    """
+    Applies the statement timeout the engine options can't set
+
+    :param engine: SQLAlchemy engine of the app
+    :param statement_timeout: Max duration in milliseconds of statements
+    :param pgbouncer: To set the PostgreSQL timeout per transaction
+    """
+
+    if not statement_timeout:
+        return
+
+    if engine.dialect.name == "postgresql" and pgbouncer:
+        # PgBouncer in transaction mode shares server sessions between
+        # clients, so the timeout is only set for the current transaction
+        @event.listens_for(engine, "begin")
+        def set_transaction_timeout(conn):
+            cursor = conn.connection.cursor()
+            cursor.execute(
+                f"SET LOCAL statement_timeout = {int(statement_timeout)}"
+            )
+            cursor.close()
+
+    elif engine.dialect.name == "sqlite":
+        # SQLite interrupts statements whose progress handler returns True
+        @event.listens_for(engine, "connect")
+        def set_progress_handler(dbapi_connection, connection_record):
+            info = connection_record.info
+            dbapi_connection.set_progress_handler(
+                lambda: time.monotonic() > info.get("deadline", float("inf")),
+                1000,
+            )
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def set_deadline(conn, cursor, statement, parameters, context, many):
+            conn.connection.info["deadline"] = (
+                time.monotonic() + statement_timeout / 1000
+            )
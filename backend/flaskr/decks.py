@@ -0,0 +1,326 @@
+import mmap
+import os
+import random
+import secrets
+import struct
+import tempfile
+import time
+from array import array
+from threading import Lock, Thread
+
+# Key of the deck of all questions, categories IDs start from 1
+ALL_CATEGORIES = 0
+
+# File layout: header, an entry per deck, then the IDs of all decks
+MAGIC = b"TRIVDECK"
+HEADER = struct.Struct("<8sQ")
+ENTRY = struct.Struct("<qQQ")
+
+
+def stratum_key(category_id, difficulty):
+    """
+    :return: key of the deck of a difficulty of a category, or of all
+        categories, negative to be told apart from categories IDs
+    """
+
+    category_id = category_id or ALL_CATEGORIES
+
+    return -(category_id * 2**32 + (difficulty & 0xFFFFFFFF)) - 1
+
+
+def copy_ids(ids):
+    """
+    :param ids: Collection of questions IDs, or IDs mapped from a file
+    :return: array of the IDs, mapped ones are copied at once
+    """
+
+    deck = array("q")
+
+    if isinstance(ids, memoryview):
+        deck.frombytes(ids.cast("B"))
+
+    else:
+        deck.extend(ids)
+
+    return deck
+
+
+def shuffle_decks(ids, strata=None):
+    """
+    Builds a random permutation of the questions IDs of every category,
+    of all categories, and of every difficulty of both
+
+    :param ids: Dict of {category id: questions IDs}
+    :param strata: Dict of {(category id, difficulty): questions IDs}
+        [optional]
+    :return: dict of {deck key: array of IDs}
+    """
+
+    decks = {ALL_CATEGORIES: array("q")}
+    merged = [ALL_CATEGORIES]
+
+    for category_id, category_ids in ids.items():
+        deck = copy_ids(category_ids)
+        random.shuffle(deck)
+        decks[category_id] = deck
+        decks[ALL_CATEGORIES].extend(deck)
+
+    for (category_id, difficulty), stratum_ids in (strata or {}).items():
+        deck = copy_ids(stratum_ids)
+        random.shuffle(deck)
+        decks[stratum_key(category_id, difficulty)] = deck
+
+        key = stratum_key(ALL_CATEGORIES, difficulty)
+
+        if key not in decks:
+            decks[key] = array("q")
+            merged.append(key)
+
+        decks[key].extend(deck)
+
+    # Decks of all categories are shuffled again once merged
+    for key in merged:
+        random.shuffle(decks[key])
+
+    return decks
+
+
+def write_decks(path, decks):
+    """Replaces the decks file at once, so readers never see it partly"""
+
+    directory = os.path.dirname(os.path.abspath(path))
+
+    with tempfile.NamedTemporaryFile(
+        "wb", dir=directory, prefix=".decks-", delete=False
+    ) as file:
+        file.write(HEADER.pack(MAGIC, len(decks)))
+        offset = (HEADER.size + ENTRY.size * len(decks)) // 8
+
+        for key, deck in decks.items():
+            file.write(ENTRY.pack(key, offset, len(deck)))
+            offset += len(deck)
+
+        for deck in decks.values():
+            deck.tofile(file)
+
+    os.replace(file.name, path)
+
+
+def map_decks(path):
+    """
+    Maps a decks file in memory, shared with every process mapping it
+
+    :return: (dict of {key: sequence of IDs}, signature of the file)
+    """
+
+    with open(path, "rb") as file:
+        stat = os.fstat(file.fileno())
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    magic, count = HEADER.unpack_from(mapped, 0)
+
+    if magic != MAGIC:
+        raise ValueError(f"Not a decks file: {path}")
+
+    ids = memoryview(mapped).cast("q")
+    decks = {}
+
+    for position in range(count):
+        key, offset, length = ENTRY.unpack_from(
+            mapped, HEADER.size + ENTRY.size * position
+        )
+        decks[key] = ids[offset : offset + length]
+
+    return decks, (stat.st_ino, stat.st_mtime_ns)
+
+
+class DeckStore:
+    """
+    Keeps precomputed random permutations (decks) of the questions IDs
+    of every category, so drawing a quiz question walks a deck from a
+    random position instead of sampling the remaining questions.
+    Decks are reshuffled in the background whenever questions change,
+    and optionally shared between processes through a mapped file.
+    """
+
+    def __init__(self, question_index, path=None, ttl=None):
+        """
+        :param question_index: QuestionIndex, or SnapshotIndex,
+            the decks are shuffled from
+        :param path: File to share the decks through
+            [optional, default=None: kept in process memory]
+        :param ttl: Max age in seconds of the decks [optional]
+        """
+
+        self.question_index = question_index
+        self.path = path
+        self.ttl = ttl
+        # Decks and their generation, replaced together
+        self._current = None
+        self._version = None
+        self._built_at = 0.0
+        self._signature = None
+        self._building = False
+        self._thread = None
+        self._lock = Lock()
+
+    def version(self):
+        return self.question_index.version()
+
+    def expired(self):
+        return self.ttl is not None and time.time() - self._built_at > self.ttl
+
+    def get(self):
+        """
+        :return: dict of {category id or ALL_CATEGORIES: sequence of IDs}
+        """
+
+        return self.generation()[0]
+
+    def generation(self):
+        """
+        :return: (dict of {category id or ALL_CATEGORIES: sequence of IDs},
+            string identifying these decks in every process)
+        """
+
+        version = self.version()
+
+        if self._current is None:
+            with self._lock:
+                if self._current is None and not self.remap():
+                    self.build(version, *self.question_index.snapshot())
+
+        elif self.path is not None:
+            # Pick up the decks reshuffled by other processes
+            self.remap()
+
+        if version != self._version or self.expired():
+            self.schedule(version)
+
+        return self._current
+
+    def current(self):
+        """
+        Same as generation, but reshuffles the decks at once
+        if questions have changed since they were shuffled
+
+        :return: (dict of decks, generation of the decks)
+        """
+
+        current = self.generation()
+
+        if self._version != self.version():
+            self.wait()
+
+            with self._lock:
+                version = self.version()
+
+                if self._version != version:
+                    self.build(version, *self.question_index.snapshot())
+
+            current = self._current
+
+        return current
+
+    def remap(self):
+        """
+        Maps the decks file again if it was replaced
+
+        :return: False if there is no decks file
+        """
+
+        if self.path is None:
+            return False
+
+        try:
+            stat = os.stat(self.path)
+
+        except FileNotFoundError:
+            return False
+
+        if (stat.st_ino, stat.st_mtime_ns) != self._signature:
+            decks, self._signature = map_decks(self.path)
+            self._current = (decks, "-".join(map(str, self._signature)))
+            self._built_at = stat.st_mtime
+            self._version = self.version()
+
+        return True
+
+    def build(self, version, ids, strata=None):
+        decks = shuffle_decks(ids, strata)
+
+        if self.path is None:
+            self._current = (decks, secrets.token_hex(8))
+            self._built_at = time.time()
+
+        else:
+            write_decks(self.path, decks)
+            decks, self._signature = map_decks(self.path)
+            self._current = (decks, "-".join(map(str, self._signature)))
+            self._built_at = os.stat(self.path).st_mtime
+
+        self._version = version
+
+    def schedule(self, version):
+        with self._lock:
+            if self._building:
+                return
+
+            self._building = True
+
+        # Take the questions IDs now, the thread needs no database session
+        ids, strata = self.question_index.snapshot()
+
+        def run():
+            try:
+                self.build(version, ids, strata)
+
+            finally:
+                self._building = False
+
+        self._thread = Thread(target=run, name="trivia-decks", daemon=True)
+        self._thread.start()
+
+    def wait(self, timeout=None):
+        """Waits for the decks being reshuffled in the background"""
+
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def draw(self, category_id=None, exclude=(), difficulty=None):
+        """
+        Draws a question id from the deck of a category, or of all
+        categories, and of a difficulty if specified, walking it from
+        a random position to the first current question that is not
+        in exclude
+
+        :param category_id: To specify a category [optional]
+        :param exclude: IDs of questions to be skipped
+        :param difficulty: To specify a difficulty [optional]
+        :return: question id, or None if every question is excluded
+        """
+
+        key = (
+            category_id or ALL_CATEGORIES
+            if difficulty is None
+            else stratum_key(category_id, difficulty)
+        )
+        deck = self.get().get(key, ())
+        exclude = set(exclude)
+
+        if deck:
+            start = random.randrange(len(deck))
+
+            for position in range(len(deck)):
+                question_id = deck[(start + position) % len(deck)]
+
+                if (
+                    question_id not in exclude
+                    and self.question_index.contains(
+                        question_id, category_id, difficulty
+                    )
+                ):
+                    return question_id
+
+        # Questions added since the deck was shuffled aren't in it yet
+        return self.question_index.pick(category_id, exclude, difficulty)
@@ -0,0 +1,161 @@
+from models import db, Question, Category
+from .read_models import PAGE_STATEMENTS
+
+
+def endpoint_queries(dialect):
+    """
+    Builds the queries of the endpoints which must be served by indexes
+
+    :param dialect: Name of the database dialect
+    :return: collection of (name, statement, params, in primary key
+        order, to let SQLite walk its table which is stored in that order)
+    """
+
+    category_id = db.session.query(db.func.min(Category.id)).scalar() or 1
+    question_id = db.session.query(db.func.min(Question.id)).scalar() or 1
+
+    queries = [
+        (
+            "GET /questions",
+            PAGE_STATEMENTS[False, False],
+            {"offset": 0, "limit": 10},
+            True,
+        ),
+        (
+            "GET /questions?after",
+            PAGE_STATEMENTS[False, True],
+            {"after": question_id, "limit": 11},
+            True,
+        ),
+        (
+            "GET /categories/<id>/questions",
+            PAGE_STATEMENTS[True, False],
+            {"category_id": category_id, "offset": 0, "limit": 10},
+            False,
+        ),
+        (
+            "GET /categories/<id>/questions?after",
+            PAGE_STATEMENTS[True, True],
+            {"category_id": category_id, "after": question_id, "limit": 11},
+            False,
+        ),
+        (
+            "GET /questions/<id>, POST /quizzes",
+            db.select([Question]).where(Question.id == question_id),
+            {},
+            False,
+        ),
+        (
+            "questions count of a category",
+            db.select([db.func.count()])
+            .select_from(Question.__table__)
+            .where(Question.category_id == category_id),
+            {},
+            False,
+        ),
+        (
+            "questions index",
+            db.select(
+                [Question.id, Question.category_id, Question.difficulty]
+            ),
+            {},
+            False,
+        ),
+    ]
+
+    # Other databases are searched by the in-process inverted index
+    if dialect == "postgresql":
+        queries.append(
+            (
+                "POST /questions (search)",
+                Question.query.filter(
+                    Question.question.ilike("%title%")
+                ).statement,
+                {},
+                False,
+            )
+        )
+
+    return queries
+
+
+def sequential_scans(plan):
+    """
+    :param plan: PostgreSQL JSON plan node
+    :return: names of the tables scanned sequentially by the plan
+    """
+
+    tables = []
+
+    if plan.get("Node Type") == "Seq Scan":
+        tables.append(plan.get("Relation Name"))
+
+    for child in plan.get("Plans", []):
+        tables.extend(sequential_scans(child))
+
+    return tables
+
+
+def explain(connection, statement, params, primary_key_order=False):
+    """
+    Explains the plan of a statement, on PostgreSQL with sequential scans
+    disabled, so a plan still scanning a table has no index to use
+
+    :param primary_key_order: If the statement reads a table in primary
+        key order, which SQLite scans as its own index
+    :return: (plan text, names of the tables scanned sequentially)
+    """
+
+    compiled = statement.compile(dialect=connection.dialect)
+    values = dict(compiled.params, **params)
+
+    if connection.dialect.name == "postgresql":
+        connection.execute("SET LOCAL enable_seqscan = off")
+        plan = connection.execute(
+            f"EXPLAIN (FORMAT JSON) {compiled}", values
+        ).scalar()[0]["Plan"]
+
+        return plan, sequential_scans(plan)
+
+    if connection.dialect.name == "sqlite":
+        rows = connection.execute(
+            f"EXPLAIN QUERY PLAN {compiled}",
+            [values[name] for name in compiled.positiontup],
+        ).fetchall()
+        details = [row[-1] for row in rows]
+
+        if primary_key_order:
+            return details, []
+
+        # Scans without any index read every row of their table
+        return details, [
+            detail.split()[-1]
+            for detail in details
+            if detail.startswith("SCAN") and "USING" not in detail
+        ]
+
+    raise ValueError(f"Unsupported dialect: {connection.dialect.name}")
+
+
+def check_plans():
+    """
+    Explains the queries of the endpoints
+
+    :return: collection of {"query", "plan", "sequential_scans"}
+    """
+
+    connection = db.session.connection()
+    results = []
+
+    for name, statement, params, primary_key_order in endpoint_queries(
+        connection.dialect.name
+    ):
+        plan, scans = explain(connection, statement, params, primary_key_order)
+        results.append(
+            {"query": name, "plan": plan, "sequential_scans": scans}
+        )
+
+    # Don't keep the planner settings in the session
+    db.session.rollback()
+
+    return results
@@ -0,0 +1,93 @@
+from models import db, Question
+
+
+def format_collection(collection):
+    return [item.format() for item in collection]
+
+
+def format_rows(rows, categories):
+    """
+    Formats questions records the same as Question.format
+
+    :param rows: Collection of QuestionRecord
+    :param categories: Dict of {category id: formatted category}
+    :return: collection of formatted questions
+    """
+
+    return [
+        {
+            "id": row.id,
+            "question": row.question,
+            "answer": row.answer,
+            "category": categories[row.category_id],
+            "difficulty": row.difficulty,
+        }
+        for row in rows
+    ]
+
+
+def parse_ids(value):
+    """
+    :param value: Comma separated string or list of questions IDs
+    :return: list of questions IDs
+    :raise ValueError: If an id isn't an integer
+    """
+
+    if isinstance(value, str):
+        value = [item for item in value.split(",") if item.strip()]
+
+    if not isinstance(value, list):
+        raise ValueError("IDs must be a list")
+
+    ids = []
+
+    for item in value:
+        if isinstance(item, bool) or not isinstance(item, (int, str)):
+            raise ValueError(f"Invalid question id: {item!r}")
+
+        ids.append(int(item))
+
+    return ids
+
+
+def int_arg(args, name):
+    """
+    :param args: Query string arguments of a request
+    :param name: Name of the argument
+    :return: integer value of the argument, or None if it isn't provided
+    :raise ValueError: If the argument isn't an integer
+    """
+
+    value = args.get(name)
+
+    if value is None:
+        return None
+
+    return int(value)
+
+
+def format_by_ids(ids, records, categories):
+    """
+    Formats questions records in the order of their requested IDs
+
+    :param ids: Requested questions IDs
+    :param records: Dict of {question id: QuestionRecord}
+    :param categories: Dict of {category id: formatted category}
+    :return: (collection of formatted questions, None for missing ones,
+        collection of missing questions IDs)
+    """
+
+    formatted = {
+        row["id"]: row for row in format_rows(records.values(), categories)
+    }
+
+    return (
+        [formatted.get(question_id) for question_id in ids],
+        [question_id for question_id in ids if question_id not in formatted],
+    )
+
+
+def with_category(query):
+    # Load the category of each question within the same query
+    # instead of lazy loading it while formatting the question
+    return query.options(db.joinedload(Question.category))
@@ -0,0 +1,181 @@
+import hashlib
+import time
+from collections import OrderedDict
+from threading import Lock
+from flask import current_app, request, g
+from models import Question, Category, versions
+from .replicas import read_engine
+
+# Tables the views of every cached endpoint are built from
+CACHED_ENDPOINTS = {
+    "categories": [Category.__tablename__],
+    "category": [Category.__tablename__],
+    "questions_in_category": [Question.__tablename__, Category.__tablename__],
+    "questions": [Question.__tablename__, Category.__tablename__],
+    "question": [Question.__tablename__, Category.__tablename__],
+}
+
+# Max number of latest ETags remembered, when more than the bodies
+MAX_ETAGS = 10000
+
+
+class ResponseCache:
+    """
+    Tags the responses of read endpoints with an ETag hashed from their
+    body, so every process tags the same body alike, remembers the
+    latest ETags until the versions of their tables, or the generations
+    of the caches of their tables, change, answers If-None-Match with
+    304 without touching the database while they're remembered, and
+    optionally keeps the latest serialized bodies in an LRU.
+    Versions only count the changes of this process, so the changes of
+    other processes are seen when the caches reload them.
+    """
+
+    def __init__(self, app, max_age=0, max_size=0, caches=None, ttl=None):
+        """
+        :param app: Flask app
+        :param max_age: Seconds clients may reuse a response without
+            revalidating it [optional, default=0]
+        :param max_size: Max number of bodies kept in memory
+            [optional, default=0: disabled]
+        :param caches: Dict of {table name: cache with a generation
+            method} [optional]
+        :param ttl: Max age in seconds of the ETags and bodies kept
+            in memory [optional, default=None: kept until they change]
+        """
+
+        self.max_age = max_age
+        self.max_size = max_size
+        self.caches = caches or {}
+        self.ttl = ttl
+        self._etags = OrderedDict()
+        self._bodies = OrderedDict()
+        self._lock = Lock()
+
+        app.extensions["response_cache"] = self
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+
+    def generation(self, table):
+        cache = self.caches.get(table)
+        return cache.generation() if cache is not None else 0
+
+    def state(self, tables):
+        """
+        :return: versions and caches generations of tables in this
+            process, telling whether a remembered ETag is still current
+        """
+
+        return tuple(
+            (versions.get(table, 0), self.generation(table))
+            for table in tables
+        )
+
+    @staticmethod
+    def etag(body):
+        return hashlib.sha1(body).hexdigest()
+
+    @staticmethod
+    def remember(entries, key, value, max_size):
+        entries[key] = value
+        entries.move_to_end(key)
+
+        while len(entries) > max_size:
+            entries.popitem(last=False)
+
+    def before_request(self):
+        tables = CACHED_ENDPOINTS.get(request.endpoint)
+
+        if request.method != "GET" or tables is None:
+            return None
+
+        # Replicas may lag behind the versions of the ETag, so their
+        # bodies are neither tagged nor revalidated
+        if read_engine() is not None:
+            return None
+
+        # Take the state before the view runs, so a change committed
+        # meanwhile makes the next request miss
+        state = g.etag_state = self.state(tables)
+
+        with self._lock:
+            remembered = self._etags.get(request.full_path)
+
+            if (
+                not remembered
+                or remembered[0] != state
+                or (self.ttl is not None and time.monotonic() > remembered[2])
+            ):
+                return None
+
+            etag = remembered[1]
+            self._etags.move_to_end(request.full_path)
+            cached = self._bodies.get(request.full_path)
+
+            if cached and cached[0] == etag:
+                self._bodies.move_to_end(request.full_path)
+
+            else:
+                cached = None
+
+        if request.if_none_match.contains_weak(etag):
+            response = self.response(b"", etag)
+            response.status_code = 304
+            return response
+
+        if cached:
+            return self.response(cached[1], etag)
+
+        return None
+
+    def after_request(self, response):
+        state = g.pop("etag_state", None)
+
+        if state is None or response.status_code not in (200, 304):
+            return response
+
+        response.cache_control.public = True
+        response.cache_control.max_age = self.max_age
+        response.cache_control.must_revalidate = True
+
+        if g.pop("cached_response", False) or response.direct_passthrough:
+            return response
+
+        body = response.get_data()
+        etag = self.etag(body)
+        response.set_etag(etag, weak=True)
+        expires = time.monotonic() + (self.ttl or 0)
+
+        with self._lock:
+            self.remember(
+                self._etags,
+                request.full_path,
+                (state, etag, expires),
+                max(self.max_size, MAX_ETAGS),
+            )
+
+            if self.max_size:
+                self.remember(
+                    self._bodies,
+                    request.full_path,
+                    (etag, body),
+                    self.max_size,
+                )
+
+        # Bodies unchanged since the client got them are not sent again
+        if request.if_none_match.contains_weak(etag):
+            response.status_code = 304
+            response.set_data(b"")
+
+        return response
+
+    @staticmethod
+    def response(body, etag):
+        # Cached responses skip storing their body again
+        g.cached_response = True
+
+        response = current_app.response_class(
+            body, mimetype="application/json"
+        )
+        response.set_etag(etag, weak=True)
+        return response
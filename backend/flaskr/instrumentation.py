@@ -0,0 +1,296 @@
+import time
+from bisect import bisect_left
+from threading import Lock
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+from .database import checkout_waits
+
+# Upper bounds in seconds of the request duration histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class RequestStats:
+    """Timings of a single request"""
+
+    __slots__ = (
+        "start",
+        "queries",
+        "db_time",
+        "pool_wait",
+        "serialization",
+        "slowest",
+    )
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0
+        self.pool_wait = 0
+        self.serialization = 0
+        self.slowest = (0, None)
+
+
+class TimedJSONProvider:
+    """Adds the time spent serializing JSON views to the request stats"""
+
+    def __init__(self, provider):
+        self.provider = provider
+
+    def dumps(self, obj):
+        start = time.perf_counter()
+
+        try:
+            return self.provider.dumps(obj)
+
+        finally:
+            stats = g.get("request_stats") if has_request_context() else None
+
+            if stats is not None:
+                stats.serialization += time.perf_counter() - start
+
+
+class Instrumentation:
+    """
+    Records the SQL queries, database time, pool checkout time and
+    serialization time of every request, reports them in a Server-Timing
+    header, aggregates them by endpoint for the Prometheus /metrics
+    endpoint and logs slow requests
+    """
+
+    def __init__(self, app, engine, replicas=(), slow_request_ms=None):
+        """
+        :param app: Flask app
+        :param engine: SQLAlchemy engine of the app
+        :param replicas: Engines of the read replicas [optional]
+        :param slow_request_ms: Min duration in milliseconds of the requests
+            to be logged [optional, default=None: disabled]
+        """
+
+        self.app = app
+        self.engine = engine
+        self.slow_request_ms = slow_request_ms
+        self._metrics = {}
+        self._lock = Lock()
+
+        app.extensions["json_provider"] = TimedJSONProvider(
+            app.extensions["json_provider"]
+        )
+
+        for watched in [engine, *replicas]:
+            event.listen(watched, "before_cursor_execute", self.before_execute)
+            event.listen(watched, "after_cursor_execute", self.after_execute)
+            event.listen(watched, "handle_error", self.handle_error)
+
+        # Registered before the other hooks to time the whole request
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+
+        app.add_url_rule("/metrics", "metrics", self.metrics)
+
+    @staticmethod
+    def before_execute(conn, cursor, statement, parameters, context, many):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @staticmethod
+    def after_execute(conn, cursor, statement, parameters, context, many):
+        Instrumentation.end_query(conn, statement)
+
+    @staticmethod
+    def handle_error(context):
+        # Failed statements end without after_cursor_execute, so their
+        # start would be taken for the start of the next ones, unlike
+        # errors fetching results, which have no statement
+        if context.statement is not None and context.connection is not None:
+            Instrumentation.end_query(context.connection, context.statement)
+
+    @staticmethod
+    def end_query(conn, statement):
+        starts = conn.info.get("query_start")
+
+        if not starts:
+            return
+
+        duration = time.perf_counter() - starts.pop()
+        stats = g.get("request_stats") if has_request_context() else None
+
+        if stats is None:
+            return
+
+        stats.queries += 1
+        stats.db_time += duration
+
+        if duration > stats.slowest[0]:
+            stats.slowest = (duration, statement)
+
+    def before_request(self):
+        g.request_stats = RequestStats()
+        checkout_waits.seconds = 0
+
+    def after_request(self, response):
+        stats = g.pop("request_stats", None)
+
+        if stats is None or request.endpoint == "metrics":
+            return response
+
+        duration = time.perf_counter() - stats.start
+        stats.pool_wait = getattr(checkout_waits, "seconds", 0)
+
+        response.headers["Server-Timing"] = ", ".join(
+            [
+                f'db;dur={stats.db_time * 1000:.2f};desc="{stats.queries} '
+                f'queries"',
+                f"pool;dur={stats.pool_wait * 1000:.2f}",
+                f"serialize;dur={stats.serialization * 1000:.2f}",
+                f"total;dur={duration * 1000:.2f}",
+            ]
+        )
+
+        self.record(
+            (request.endpoint or "", request.method, response.status_code),
+            duration,
+            stats,
+        )
+
+        if (
+            self.slow_request_ms is not None
+            and duration * 1000 >= self.slow_request_ms
+        ):
+            self.app.logger.warning(
+                "Slow request %s %s (%d): %.1fms, %d queries in %.1fms, "
+                "serialization %.1fms, slowest query %.1fms: %s",
+                request.method,
+                request.full_path,
+                response.status_code,
+                duration * 1000,
+                stats.queries,
+                stats.db_time * 1000,
+                stats.serialization * 1000,
+                stats.slowest[0] * 1000,
+                stats.slowest[1],
+            )
+
+        return response
+
+    def record(self, key, duration, stats):
+        with self._lock:
+            metrics = self._metrics.get(key)
+
+            if metrics is None:
+                metrics = self._metrics[key] = {
+                    "count": 0,
+                    "duration": 0,
+                    "buckets": [0] * (len(BUCKETS) + 1),
+                    "queries": 0,
+                    "db_time": 0,
+                    "pool_wait": 0,
+                    "serialization": 0,
+                }
+
+            metrics["count"] += 1
+            metrics["duration"] += duration
+            metrics["queries"] += stats.queries
+            metrics["db_time"] += stats.db_time
+            metrics["pool_wait"] += stats.pool_wait
+            metrics["serialization"] += stats.serialization
+
+            # Buckets are counted individually, and summed up when exposed,
+            # the last one counts durations above every bound
+            metrics["buckets"][bisect_left(BUCKETS, duration)] += 1
+
+    def metrics(self):
+        """
+        (1) Creates endpoint for fetching the requests metrics
+        (2) Methods: GET
+        (3) Arguments: no arguments needed
+
+        :return: Prometheus text exposition of the metrics by endpoint
+        """
+
+        with self._lock:
+            snapshot = {
+                key: dict(metrics, buckets=list(metrics["buckets"]))
+                for key, metrics in self._metrics.items()
+            }
+
+        families = [
+            ("requests_total", "counter", "Requests handled", "count"),
+            (
+                "db_queries_total",
+                "counter",
+                "SQL queries executed by requests",
+                "queries",
+            ),
+            (
+                "db_duration_seconds_total",
+                "counter",
+                "Time spent in SQL queries by requests",
+                "db_time",
+            ),
+            (
+                "db_pool_wait_seconds_total",
+                "counter",
+                "Time spent checking out pool connections by requests",
+                "pool_wait",
+            ),
+            (
+                "serialization_duration_seconds_total",
+                "counter",
+                "Time spent serializing JSON views",
+                "serialization",
+            ),
+        ]
+
+        lines = []
+
+        for name, kind, description, field in families:
+            lines.append(f"# HELP trivia_{name} {description}")
+            lines.append(f"# TYPE trivia_{name} {kind}")
+
+            for key, metrics in sorted(snapshot.items()):
+                lines.append(
+                    f"trivia_{name}{{{labels(key)}}} {metrics[field]}"
+                )
+
+        name = "trivia_request_duration_seconds"
+        lines.append(f"# HELP {name} Duration of requests")
+        lines.append(f"# TYPE {name} histogram")
+
+        for key, metrics in sorted(snapshot.items()):
+            cumulative = 0
+
+            for bound, count in zip(BUCKETS + ("+Inf",), metrics["buckets"]):
+                cumulative += count
+                bucket_labels = f'{labels(key)},le="{bound}"'
+                lines.append(f"{name}_bucket{{{bucket_labels}}} {cumulative}")
+
+            lines.append(f"{name}_sum{{{labels(key)}}} {metrics['duration']}")
+            lines.append(f"{name}_count{{{labels(key)}}} {metrics['count']}")
+
+        # Connections of the pool at the time of the scrape
+        pool = self.engine.pool
+
+        if isinstance(pool, QueuePool):
+            for name, description, value in (
+                ("size", "Connections kept open by the pool", pool.size()),
+                ("checked_out", "Connections in use", pool.checkedout()),
+                ("checked_in", "Idle connections", pool.checkedin()),
+                (
+                    "overflow",
+                    "Connections opened beyond the pool size",
+                    max(pool.overflow(), 0),
+                ),
+            ):
+                lines.append(f"# HELP trivia_db_pool_{name} {description}")
+                lines.append(f"# TYPE trivia_db_pool_{name} gauge")
+                lines.append(f"trivia_db_pool_{name} {value}")
+
+        return self.app.response_class(
+            "\n".join(lines) + "\n",
+            content_type="text/plain; version=0.0.4; charset=utf-8",
+        )
+
+
+def labels(key):
+    endpoint, method, status = key
+    return f'endpoint="{endpoint}",method="{method}",status="{status}"'
@@ -0,0 +1,183 @@
+from models import db, Question, Category, RowChange, bump_versions
+from .read_models import QUESTION_COLUMNS, QuestionRecord
+
+ACTIONS = ("delete", "recategorize")
+
+# Filters of the questions to be changed, by their column
+FILTERS = {
+    "category_id": lambda value: Question.category_id == value,
+    "difficulty": lambda value: Question.difficulty == value,
+    "min_id": lambda value: Question.id >= value,
+    "max_id": lambda value: Question.id <= value,
+}
+
+# Max number of IDs bound to a single IN list
+CHUNK_SIZE = 500
+
+
+def conditions(ids=None, filters=None):
+    """
+    :param ids: Collection of questions IDs [optional]
+    :param filters: Dict of {filter name: integer} [optional]
+    :return: list of where clauses of the filters
+    :raise ValueError: If nothing is selected or a filter is unknown
+    """
+
+    filters = filters or {}
+
+    if not isinstance(filters, dict):
+        raise ValueError("filters must be an object")
+
+    if ids is None and not filters:
+        raise ValueError("ids or filters are required")
+
+    clauses = []
+
+    for name, value in filters.items():
+        if name not in FILTERS:
+            raise ValueError(f"Unknown filter: {name}")
+
+        if isinstance(value, bool) or not isinstance(value, int):
+            raise ValueError(f"{name} must be an integer")
+
+        clauses.append(FILTERS[name](value))
+
+    return clauses
+
+
+def by_ids(statement, ids):
+    """
+    Splits a statement into statements of CHUNK_SIZE IDs at most,
+    as databases limit the number of bound values
+
+    :param ids: Collection of questions IDs, or None for all questions
+    :return: iterator of statements
+    """
+
+    if ids is None:
+        yield statement
+        return
+
+    ids = list(dict.fromkeys(ids))
+
+    for start in range(0, len(ids), CHUNK_SIZE):
+        yield statement.where(Question.id.in_(ids[start : start + CHUNK_SIZE]))
+
+
+def mutate_questions(
+    action, ids=None, filters=None, to_category_id=None, dry_run=False
+):
+    """
+    Deletes or re-categorizes every question matching IDs and filters
+    in a single transaction, by set-based statements, then invalidates
+    the caches of questions once
+
+    :param action: "delete" or "recategorize"
+    :param ids: Collection of questions IDs [optional]
+    :param filters: Dict of "category_id", "difficulty", "min_id"
+        and "max_id" [optional]
+    :param to_category_id: Category the questions are moved to
+        [required to recategorize]
+    :param dry_run: To count the matching questions without changing them
+    :return: dict of
+        "action" [string],
+        "affected" [number of changed, or matching, questions],
+        "dry_run" [boolean]
+    :raise ValueError: If the action, filters or category are invalid
+    """
+
+    if action not in ACTIONS:
+        raise ValueError(f"Unknown action: {action}")
+
+    clauses = conditions(ids, filters)
+
+    if action == "recategorize":
+        if not db.session.query(
+            db.session.query(Category)
+            .filter(Category.id == to_category_id)
+            .exists()
+        ).scalar():
+            raise ValueError(f"category {to_category_id} doesn't exist")
+
+        # Questions already in the category are left as they are
+        clauses.append(Question.category_id != to_category_id)
+
+    report = {"action": action, "affected": 0, "dry_run": dry_run}
+
+    count = db.select([db.func.count(Question.id)])
+    select = db.select(QUESTION_COLUMNS).with_for_update()
+    delete = Question.__table__.delete()
+
+    for clause in clauses:
+        count = count.where(clause)
+        select = select.where(clause)
+        delete = delete.where(clause)
+
+    if dry_run:
+        report["affected"] = sum(
+            db.session.execute(statement).scalar()
+            for statement in by_ids(count, ids)
+        )
+        return report
+
+    try:
+        if (
+            action == "delete"
+            and db.session.connection().dialect.name == "postgresql"
+        ):
+            # Delete and read the deleted rows by the same statements
+            rows = [
+                QuestionRecord._make(row)
+                for statement in by_ids(
+                    delete.returning(*QUESTION_COLUMNS), ids
+                )
+                for row in db.session.execute(statement)
+            ]
+
+        else:
+            # Lock the matching rows, and keep their values for the caches
+            rows = [
+                QuestionRecord._make(row)
+                for statement in by_ids(select, ids)
+                for row in db.session.execute(statement)
+            ]
+
+            if action == "delete":
+                statement = Question.__table__.delete()
+
+            else:
+                statement = Question.__table__.update().values(
+                    category_id=to_category_id
+                )
+
+            for chunk in by_ids(statement, [row.id for row in rows]):
+                db.session.execute(chunk)
+
+        db.session.commit()
+
+    except BaseException:
+        db.session.rollback()
+        raise
+
+    if rows:
+        # A single version for the whole batch, with its row changes
+        # for the caches to apply instead of reloading questions
+        changes = [
+            RowChange(
+                id=row.id,
+                old=row._asdict(),
+                new=(
+                    None
+                    if action == "delete"
+                    else dict(row._asdict(), category_id=to_category_id)
+                ),
+            )
+            for row in rows
+        ]
+        bump_versions(
+            Question.__tablename__,
+            changes={Question.__tablename__: changes},
+        )
+
+    report["affected"] = len(rows)
+    return report
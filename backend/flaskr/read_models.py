@@ -0,0 +1,185 @@
+from collections import namedtuple
+from models import db, Question
+
+# Columns of questions read by the list endpoints
+QUESTION_COLUMNS = (
+    Question.id,
+    Question.question,
+    Question.answer,
+    Question.difficulty,
+    Question.category_id,
+)
+
+
+class QuestionRecord(
+    namedtuple("QuestionRecord", [column.key for column in QUESTION_COLUMNS])
+):
+    """Read-only question row, without any ORM state"""
+
+    __slots__ = ()
+
+
+def _page_statement(by_category, cursor):
+    """
+    Builds the select of a page of questions ordered by id,
+    with its values bound at execution
+
+    :param by_category: To select questions of the "category_id" only
+    :param cursor: To start after the "after" question id instead of
+        skipping "offset" questions
+    :return: Core select
+    """
+
+    statement = db.select(QUESTION_COLUMNS).order_by(Question.id)
+
+    if by_category:
+        statement = statement.where(
+            Question.category_id == db.bindparam("category_id")
+        )
+
+    if cursor:
+        statement = statement.where(Question.id > db.bindparam("after"))
+
+    else:
+        statement = statement.offset(db.bindparam("offset"))
+
+    return statement.limit(db.bindparam("limit"))
+
+
+# Statements are built once, so their compiled SQL can be reused
+PAGE_STATEMENTS = {
+    (by_category, cursor): _page_statement(by_category, cursor)
+    for by_category in (False, True)
+    for cursor in (False, True)
+}
+
+# Expanded to the requested IDs at execution
+IDS_STATEMENT = db.select(QUESTION_COLUMNS).where(
+    Question.id.in_(db.bindparam("ids", expanding=True))
+)
+
+_compiled_cache = {}
+
+
+def fetch_records(statement, **params):
+    """
+    Executes a select of QUESTION_COLUMNS on the session connection,
+    compiling the statement only on its first execution
+
+    :return: collection of QuestionRecord
+    """
+
+    connection = db.session.connection().execution_options(
+        compiled_cache=_compiled_cache
+    )
+
+    return [
+        QuestionRecord._make(row)
+        for row in connection.execute(statement, params)
+    ]
+
+
+def fetch_page(offset, limit, after=None, category_id=None):
+    """
+    Fetches a page of questions records ordered by id,
+    by skipping offset questions or, in cursor mode,
+    by starting after a question id
+
+    :param offset: Number of questions to be skipped
+    :param limit: Max number of questions in page
+    :param after: Cursor question id [optional, default=None]
+    :param category_id: To fetch questions of a category only
+        [optional, default=None: all questions]
+    :return: (questions records in page, next cursor or None in last page)
+    """
+
+    statement = PAGE_STATEMENTS[category_id is not None, after is not None]
+    params = {"limit": limit}
+
+    if category_id is not None:
+        params["category_id"] = category_id
+
+    if after is None:
+        params["offset"] = offset
+        return fetch_records(statement, **params), None
+
+    # An empty page has no next page, its lookahead question aside
+    if limit < 1:
+        return [], None
+
+    # Fetch one more question to tell whether a next page exists
+    params["after"] = after
+    params["limit"] = limit + 1
+    questions = fetch_records(statement, **params)
+
+    if len(questions) > limit:
+        return questions[:limit], questions[limit - 1].id
+
+    return questions, None
+
+
+def fetch_by_ids(ids):
+    """
+    Fetches the questions records of many IDs by a single query
+
+    :param ids: Collection of questions IDs
+    :return: dict of {question id: QuestionRecord} of the existing ones
+    """
+
+    if not ids:
+        return {}
+
+    return {
+        record.id: record
+        for record in fetch_records(IDS_STATEMENT, ids=list(set(ids)))
+    }
+
+
+def stream_records(
+    category_id=None, after=None, min_id=None, max_id=None, batch_size=1000
+):
+    """
+    Streams questions records ordered by id from a server-side cursor,
+    a batch at a time, so memory stays flat whatever the number of
+    questions
+
+    :param category_id: To stream questions of a category only [optional]
+    :param after: To resume after a question id [optional]
+    :param min_id: Min question id [optional]
+    :param max_id: Max question id [optional]
+    :param batch_size: Number of rows fetched at once [optional]
+    :return: iterator of collections of QuestionRecord
+    """
+
+    statement = db.select(QUESTION_COLUMNS).order_by(Question.id)
+
+    if category_id is not None:
+        statement = statement.where(Question.category_id == category_id)
+
+    if after is not None:
+        statement = statement.where(Question.id > after)
+
+    if min_id is not None:
+        statement = statement.where(Question.id >= min_id)
+
+    if max_id is not None:
+        statement = statement.where(Question.id <= max_id)
+
+    # Named cursor on PostgreSQL, rows are fetched as they're consumed
+    result = (
+        db.session.connection()
+        .execution_options(stream_results=True)
+        .execute(statement)
+    )
+
+    try:
+        while True:
+            rows = result.fetchmany(batch_size)
+
+            if not rows:
+                return
+
+            yield [QuestionRecord._make(row) for row in rows]
+
+    finally:
+        result.close()
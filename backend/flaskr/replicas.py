@@ -0,0 +1,222 @@
+import itertools
+import math
+import threading
+import time
+from contextlib import contextmanager
+from flask import request
+from sqlalchemy import event
+
+# Replica engine serving the reads of the current request, depth of the
+# use_primary blocks and whether the request committed to the primary
+routing = threading.local()
+
+# Endpoints only reading the database, although called with POST
+READ_ENDPOINTS = frozenset({"quizzes", "quiz_sessions", "quiz_session_next"})
+
+# Cookie holding the time a client last wrote to the primary
+LAST_WRITE_COOKIE = "trivia_last_write"
+
+
+@contextmanager
+def use_primary():
+    """Reads from the primary database in the block"""
+
+    depth = getattr(routing, "primary", 0)
+    routing.primary = depth + 1
+
+    try:
+        yield
+
+    finally:
+        routing.primary = depth
+
+
+def read_engine():
+    """
+    :return: replica engine the current thread reads from,
+        or None to read from the primary database
+    """
+
+    if getattr(routing, "primary", 0):
+        return None
+
+    return getattr(routing, "replica", None)
+
+
+class Replica:
+    """Engine of a read replica and its last health check"""
+
+    __slots__ = ("name", "engine", "healthy", "checked_at")
+
+    def __init__(self, name, engine):
+        self.name = name
+        self.engine = engine
+        self.healthy = True
+        self.checked_at = float("-inf")
+
+
+class ReplicaRouter:
+    """
+    Sends the reads of read-only requests to read replicas in round
+    robin, skipping the replicas failing their health check, while
+    writes and every other request use the primary database.
+    Clients read from the primary for a while after writing if
+    read_your_writes is set, so replication lag never hides their writes.
+    """
+
+    def __init__(
+        self, app, primary, replicas, health_interval=5, read_your_writes=0
+    ):
+        """
+        :param app: Flask app
+        :param primary: Engine of the primary database
+        :param replicas: Dict of {bind name: engine} of the replicas
+        :param health_interval: Seconds between health checks
+            of a replica [optional, default=5]
+        :param read_your_writes: Seconds a client reads from the primary
+            after writing [optional, default=0: disabled]
+        """
+
+        self.replicas = [
+            Replica(name, engine) for name, engine in replicas.items()
+        ]
+        self.health_interval = health_interval
+        self.read_your_writes = read_your_writes
+        self._counter = itertools.count()
+
+        app.extensions["read_replicas"] = self
+
+        if not self.replicas:
+            return
+
+        for replica in self.replicas:
+            event.listen(
+                replica.engine, "handle_error", self.error_handler(replica)
+            )
+
+        # Flag the requests committing on the primary
+        event.listen(primary, "commit", self.flag_write)
+
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+        app.teardown_request(self.teardown_request)
+
+    def engines(self):
+        return [replica.engine for replica in self.replicas]
+
+    def read_engine(self):
+        return read_engine()
+
+    def error_handler(self, replica):
+        def handle_error(context):
+            # Stop reading from a replica that dropped its connections
+            # until its next health check
+            if context.is_disconnect:
+                replica.healthy = False
+                replica.checked_at = time.monotonic()
+
+        return handle_error
+
+    def check(self, replica):
+        """
+        Runs a health check of a replica unless it was checked
+        in the last health_interval seconds
+
+        :return: True if the replica is healthy
+        """
+
+        now = time.monotonic()
+
+        if now - replica.checked_at < self.health_interval:
+            return replica.healthy
+
+        # Set first, so concurrent requests don't check it again
+        replica.checked_at = now
+
+        try:
+            with replica.engine.connect() as connection:
+                connection.execute("SELECT 1")
+
+            replica.healthy = True
+
+        except Exception:
+            replica.healthy = False
+
+        return replica.healthy
+
+    def choose(self):
+        """
+        :return: engine of the next healthy replica in round robin,
+            or None if none of them is healthy
+        """
+
+        start = next(self._counter)
+
+        for position in range(len(self.replicas)):
+            replica = self.replicas[(start + position) % len(self.replicas)]
+
+            if self.check(replica):
+                return replica.engine
+
+        return None
+
+    def wrote_recently(self):
+        last_write = request.cookies.get(LAST_WRITE_COOKIE, type=float)
+
+        return (
+            last_write is not None
+            and time.time() - last_write < self.read_your_writes
+        )
+
+    def route(self):
+        """
+        :return: engine of the replica to read from, or None
+            if the client must read its own writes from the primary
+        """
+
+        if not self.replicas or (
+            self.read_your_writes and self.wrote_recently()
+        ):
+            return None
+
+        return self.choose()
+
+    @contextmanager
+    def reading(self):
+        """Reads from a replica in the block, for e.g., searching"""
+
+        replica = getattr(routing, "replica", None)
+        routing.replica = self.route()
+
+        try:
+            yield
+
+        finally:
+            routing.replica = replica
+
+    @staticmethod
+    def flag_write(conn):
+        routing.wrote = True
+
+    def before_request(self):
+        routing.wrote = False
+        routing.replica = None
+
+        if request.method in ("GET", "HEAD") or (
+            request.endpoint in READ_ENDPOINTS
+        ):
+            routing.replica = self.route()
+
+    def after_request(self, response):
+        if self.read_your_writes and getattr(routing, "wrote", False):
+            response.set_cookie(
+                LAST_WRITE_COOKIE,
+                f"{time.time():.3f}",
+                max_age=math.ceil(self.read_your_writes),
+                httponly=True,
+            )
+
+        return response
+
+    def teardown_request(self, exception=None):
+        routing.replica = None
@@ -0,0 +1,281 @@
+import heapq
+import math
+import re
+from bisect import bisect_left
+from collections import namedtuple
+from models import db, Question
+from .caches import TableCache
+from .helpers import with_category
+
+# A page of search results, where total is the planner estimate
+# of the number of results if estimated is True
+SearchPage = namedtuple("SearchPage", ["questions", "total", "estimated"])
+
+
+def tokenize(text):
+    return re.findall(r"\w+", text.lower())
+
+
+def estimate_count(query):
+    """
+    Reads the number of rows the PostgreSQL planner expects a query to return
+
+    :return: estimated number of rows, or None on other databases
+    """
+
+    connection = db.session.connection()
+
+    if connection.dialect.name != "postgresql":
+        return None
+
+    compiled = query.statement.compile(dialect=connection.dialect)
+    plan = connection.execute(
+        f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params
+    ).scalar()
+
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class SQLSearch:
+    """
+    Base of the backends searching in SQL, fetches a page of results
+    together with their total number in a single query
+    """
+
+    def __init__(self, estimate_threshold=None):
+        """
+        :param estimate_threshold: Min number of results expected by
+            the planner to return its estimate instead of the exact total
+            [optional, default=None: always exact]
+        """
+
+        self.estimate_threshold = estimate_threshold
+
+    def paginate(self, results, order_by, offset, limit):
+        page = with_category(results).order_by(*order_by)
+
+        if self.estimate_threshold is not None:
+            estimate = estimate_count(results)
+
+            # Broad terms skip counting all of their results
+            if estimate is not None and estimate >= self.estimate_threshold:
+                return SearchPage(
+                    page.offset(offset).limit(limit).all(), estimate, True
+                )
+
+        rows = (
+            page.add_columns(db.func.count().over())
+            .offset(offset)
+            .limit(limit)
+            .all()
+        )
+
+        if rows:
+            return SearchPage([row[0] for row in rows], rows[0][1], False)
+
+        # Past the last page the total must be counted on its own
+        return SearchPage([], results.count() if offset else 0, False)
+
+
+class LikeSearch(SQLSearch):
+    """
+    Matches questions including the search term anywhere in their text,
+    served by the trigram indexes on PostgreSQL
+    """
+
+    def search(self, term, offset, limit, search_answers=False):
+        """
+        :param term: Search keyword
+        :param offset: Number of results to be skipped
+        :param limit: Max number of results to be returned
+        :param search_answers: To match answers as well [optional]
+        :return: SearchPage of results
+        """
+
+        pattern = f"%{term}%"
+        criterion = Question.question.ilike(pattern)
+
+        if search_answers:
+            criterion = db.or_(criterion, Question.answer.ilike(pattern))
+
+        return self.paginate(
+            Question.query.filter(criterion), [Question.id], offset, limit
+        )
+
+
+class FullTextSearch(SQLSearch):
+    """
+    Ranked search over the GIN indexed tsvector of questions (PostgreSQL),
+    the last word of the term is matched as a prefix while typing
+    """
+
+    # Must match the expressions of the indexes created by the migrations
+    config = db.literal_column("'english'::regconfig")
+
+    def __init__(self, estimate_threshold=None):
+        super().__init__(estimate_threshold)
+        self.fallback = LikeSearch(estimate_threshold)
+
+    def document(self, search_answers):
+        text = Question.question
+
+        if search_answers:
+            text = Question.question + " " + Question.answer
+
+        return db.func.to_tsvector(self.config, text)
+
+    def search(self, term, offset, limit, search_answers=False):
+        words = tokenize(term)
+
+        # Terms without any word can only be matched literally
+        if not words:
+            return self.fallback.search(term, offset, limit, search_answers)
+
+        query = db.func.to_tsquery(
+            self.config, " & ".join(words[:-1] + [f"{words[-1]}:*"])
+        )
+        document = self.document(search_answers)
+
+        return self.paginate(
+            Question.query.filter(document.op("@@")(query)),
+            [db.func.ts_rank(document, query).desc(), Question.id],
+            offset,
+            limit,
+        )
+
+
+class InvertedIndexSearch:
+    """
+    Ranked search over an in-process inverted index of questions words,
+    for databases without full text search (SQLite, testing)
+    """
+
+    def __init__(self, ttl=None):
+        self._cache = TableCache(
+            self._load, tables=[Question.__tablename__], ttl=ttl
+        )
+
+    @staticmethod
+    def _load():
+        postings = {"question": {}, "answer": {}}
+        total = 0
+
+        for question_id, question, answer in db.session.query(
+            Question.id, Question.question, Question.answer
+        ):
+            total += 1
+
+            for field, text in (("question", question), ("answer", answer)):
+                for word in tokenize(text):
+                    frequencies = postings[field].setdefault(word, {})
+                    frequencies[question_id] = (
+                        frequencies.get(question_id, 0) + 1
+                    )
+
+        # Keep every field words sorted for prefix lookups
+        return total, {
+            field: (sorted(field_postings), field_postings)
+            for field, field_postings in postings.items()
+        }
+
+    @staticmethod
+    def _match(word, prefix, fields, total):
+        """
+        Scores the questions matching a word by tf-idf
+
+        :return: dict of {question id: score}
+        """
+
+        scores = {}
+
+        for vocabulary, field_postings in fields:
+            if prefix:
+                start = bisect_left(vocabulary, word)
+                end = bisect_left(vocabulary, word + "\uffff", start)
+                words = vocabulary[start:end]
+
+            else:
+                words = [word] if word in field_postings else []
+
+            for matched_word in words:
+                frequencies = field_postings[matched_word]
+                idf = math.log(1 + total / len(frequencies))
+
+                for question_id, frequency in frequencies.items():
+                    scores[question_id] = (
+                        scores.get(question_id, 0) + frequency * idf
+                    )
+
+        return scores
+
+    def search(self, term, offset, limit, search_answers=False):
+        words = tokenize(term)
+
+        if not words:
+            return SearchPage([], 0, False)
+
+        total, index = self._cache.get()
+        fields = [index["question"]]
+
+        if search_answers:
+            fields.append(index["answer"])
+
+        # Every word must match, the last one as a prefix
+        scores = None
+
+        for position, word in enumerate(words):
+            word_scores = self._match(
+                word, position == len(words) - 1, fields, total
+            )
+
+            if scores is None:
+                scores = word_scores
+
+            else:
+                scores = {
+                    question_id: score + word_scores[question_id]
+                    for question_id, score in scores.items()
+                    if question_id in word_scores
+                }
+
+        # Rank only the results up to the requested page
+        page_ids = heapq.nsmallest(
+            offset + limit, scores, key=lambda qid: (-scores[qid], qid)
+        )[offset:]
+
+        questions = {
+            question.id: question
+            for question in with_category(Question.query)
+            .filter(Question.id.in_(page_ids))
+            .all()
+        }
+
+        return SearchPage(
+            [questions[qid] for qid in page_ids if qid in questions],
+            len(scores),
+            False,
+        )
+
+
+def create_search_backend(name, dialect, ttl=None, estimate_threshold=None):
+    """
+    :param name: "like" [default], "fulltext" or "inverted"
+    :param dialect: Name of the database dialect
+    :param ttl: Max age in seconds of the in-process inverted index
+    :param estimate_threshold: Min number of results to be estimated
+        instead of counted by the SQL backends
+    :return: Search backend
+    """
+
+    if name == "like":
+        return LikeSearch(estimate_threshold)
+
+    # Full text search falls back to the inverted index
+    # on databases other than PostgreSQL
+    if name == "fulltext" and dialect == "postgresql":
+        return FullTextSearch(estimate_threshold)
+
+    if name in ("fulltext", "inverted"):
+        return InvertedIndexSearch(ttl=ttl)
+
+    raise ValueError(f"Unknown search backend: {name}")
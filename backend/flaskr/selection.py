@@ -0,0 +1,179 @@
+import random
+from models import db, Question, versions
+from .caches import TableCache
+
+
+class QuestionIndex:
+    """
+    Keeps the questions IDs of every category, and of every difficulty
+    of every category (strata), in memory to draw quiz questions and
+    count questions without querying them, kept current by applying
+    the committed changes of questions
+    """
+
+    def __init__(self, ttl=None):
+        self._cache = TableCache(
+            self._load,
+            tables=[Question.__tablename__],
+            ttl=ttl,
+            apply=self._apply,
+        )
+
+    @staticmethod
+    def _load():
+        ids = {}
+        strata = {}
+
+        for question_id, category_id, difficulty in db.session.query(
+            Question.id, Question.category_id, Question.difficulty
+        ):
+            ids.setdefault(category_id, set()).add(question_id)
+            strata.setdefault((category_id, difficulty), set()).add(
+                question_id
+            )
+
+        return (
+            {key: frozenset(key_ids) for key, key_ids in ids.items()},
+            {key: frozenset(key_ids) for key, key_ids in strata.items()},
+        )
+
+    @staticmethod
+    def _apply(value, changes):
+        ids, strata = dict(value[0]), dict(value[1])
+
+        # Replace the changed sets, as other threads may be reading them
+        for change in changes:
+            for values, update in (
+                (change.old, frozenset.difference),
+                (change.new, frozenset.union),
+            ):
+                if not values:
+                    continue
+
+                category_id = values["category_id"]
+                stratum = (category_id, values["difficulty"])
+                ids[category_id] = update(
+                    ids.get(category_id, frozenset()), {change.id}
+                )
+                strata[stratum] = update(
+                    strata.get(stratum, frozenset()), {change.id}
+                )
+
+        return ids, strata
+
+    def version(self):
+        return versions.get(Question.__tablename__, 0)
+
+    def generation(self):
+        return self._cache.generation()
+
+    def ids(self, category_id, difficulty=None):
+        if difficulty is not None:
+            return self._cache.get()[1].get(
+                (category_id, difficulty), frozenset()
+            )
+
+        return self._cache.get()[0].get(category_id, frozenset())
+
+    def all_ids(self, difficulty=None):
+        if difficulty is not None:
+            return frozenset().union(
+                *(
+                    stratum_ids
+                    for (_, stratum_difficulty), stratum_ids in (
+                        self._cache.get()[1].items()
+                    )
+                    if stratum_difficulty == difficulty
+                )
+            )
+
+        return frozenset().union(*self._cache.get()[0].values())
+
+    def snapshot(self):
+        """
+        Sets are replaced on changes, so the dicts can be read unlocked
+
+        :return: (dict of {category id: IDs},
+            dict of {(category id, difficulty): IDs})
+        """
+
+        return self._cache.get()
+
+    def contains(self, question_id, category_id=None, difficulty=None):
+        if category_id:
+            return question_id in self.ids(category_id, difficulty)
+
+        if difficulty is not None:
+            return any(
+                question_id in stratum_ids
+                for (_, stratum_difficulty), stratum_ids in (
+                    self._cache.get()[1].items()
+                )
+                if stratum_difficulty == difficulty
+            )
+
+        return any(question_id in ids for ids in self._cache.get()[0].values())
+
+    def count(self, category_id, difficulty=None):
+        return len(self.ids(category_id, difficulty))
+
+    def total(self):
+        return sum(len(ids) for ids in self._cache.get()[0].values())
+
+    def pick(self, category_id=None, exclude=(), difficulty=None):
+        """
+        Draws a question id uniformly from the ids of a category,
+        or of all categories, that are not in exclude
+
+        :param category_id: To specify a category [optional]
+        :param exclude: IDs of questions to be skipped
+        :param difficulty: To specify a difficulty [optional]
+        :return: question id, or None if every question is excluded
+        """
+
+        if category_id:
+            ids = self.ids(category_id, difficulty)
+
+        else:
+            ids = self.all_ids(difficulty)
+
+        remaining = ids.difference(exclude)
+
+        if not remaining:
+            return None
+
+        return random.choice(tuple(remaining))
+
+
+def turn_difficulty(difficulty=None, ramp=None, turn=0):
+    """
+    :param difficulty: Difficulty of every question [optional]
+    :param ramp: Difficulties of the questions by turn, the last one
+        is kept for the next turns [optional]
+    :param turn: Number of questions already played
+    :return: difficulty of the question of the turn, or None for any
+    :raise ValueError: If the difficulty or the ramp is invalid
+    """
+
+    def valid(value):
+        return isinstance(value, int) and not isinstance(value, bool)
+
+    if difficulty is not None and ramp is not None:
+        raise ValueError("difficulty and ramp can't be used together")
+
+    if difficulty is not None:
+        if not valid(difficulty):
+            raise ValueError("difficulty must be an integer")
+
+        return difficulty
+
+    if ramp is not None:
+        if not isinstance(ramp, list) or not ramp:
+            raise ValueError("ramp must be a non-empty list")
+
+        if not all(valid(value) for value in ramp):
+            raise ValueError("ramp must be a list of integers")
+
+        return ramp[min(turn, len(ramp) - 1)]
+
+    return None
@@ -0,0 +1,86 @@
+import zlib
+from flask import current_app, json
+
+try:
+    import orjson
+
+except ImportError:
+    orjson = None
+
+
+class StdlibJSONProvider:
+    """Serializes JSON by the standard library, the same as jsonify"""
+
+    def dumps(self, obj):
+        return json.dumps(obj, separators=(",", ":")).encode()
+
+
+class OrjsonJSONProvider:
+    """Serializes JSON by orjson, which is several times faster"""
+
+    def __init__(self, sort_keys=True):
+        self.option = orjson.OPT_SORT_KEYS if sort_keys else 0
+
+    def dumps(self, obj):
+        return orjson.dumps(obj, option=self.option)
+
+
+def create_json_provider(name, sort_keys=True):
+    """
+    :param name: "auto" [default: orjson if installed], "orjson" or "stdlib"
+    :param sort_keys: To sort keys of JSON objects
+    :return: JSON provider
+    """
+
+    if name == "orjson" or (name == "auto" and orjson is not None):
+        if orjson is None:
+            raise RuntimeError("orjson must be installed to be used")
+
+        return OrjsonJSONProvider(sort_keys=sort_keys)
+
+    if name in ("auto", "stdlib"):
+        return StdlibJSONProvider()
+
+    raise ValueError(f"Unknown JSON provider: {name}")
+
+
+def jsonify(*args, **kwargs):
+    """
+    Creates a JSON response like flask.jsonify
+    by the JSON provider of the current app
+    """
+
+    data = args[0] if len(args) == 1 else (args or kwargs)
+    provider = current_app.extensions["json_provider"]
+
+    return current_app.response_class(
+        provider.dumps(data) + b"\n",
+        mimetype=current_app.config["JSONIFY_MIMETYPE"],
+    )
+
+
+def ndjson_chunks(batches, provider, compress=False):
+    """
+    Serializes batches of JSON objects as newline-delimited JSON,
+    a chunk per batch
+
+    :param batches: Iterator of collections of JSON objects
+    :param provider: JSON provider
+    :param compress: To gzip the chunks [optional, default=False]
+    :return: iterator of bytes
+    """
+
+    # wbits=31 writes the gzip header and trailer around the stream
+    compressor = zlib.compressobj(wbits=31) if compress else None
+
+    for batch in batches:
+        chunk = b"".join(provider.dumps(obj) + b"\n" for obj in batch)
+
+        if compressor is not None:
+            chunk = compressor.compress(chunk)
+
+        if chunk:
+            yield chunk
+
+    if compressor is not None:
+        yield compressor.flush()
@@ -0,0 +1,265 @@
+import math
+import random
+import struct
+import time
+from array import array
+from collections import OrderedDict
+from threading import Lock
+
+# Bytes of a question id in a deck stored in Redis
+ITEM = struct.Struct("<q")
+
+
+def session_order(length):
+    """
+    Sets the order a session walks a shared deck in, so sessions of the
+    same deck play it in different orders without copying it
+
+    :param length: Number of questions in the deck
+    :return: (offset, stride), the stride being coprime with the length
+        so the walk visits every position once
+    """
+
+    if length < 2:
+        return 0, 1
+
+    stride = random.randrange(1, length)
+
+    while math.gcd(stride, length) != 1:
+        stride = random.randrange(1, length)
+
+    return random.randrange(length), stride
+
+
+def session_position(length, offset, stride, played):
+    """
+    :return: position in the deck of the question following the
+        played ones
+    """
+
+    return (offset + stride * played) % length
+
+
+class MemorySessionStore:
+    """
+    Keeps quiz sessions in process memory, dropping the least recently
+    used sessions beyond max_sessions and the ones idle for ttl seconds.
+    Sessions only keep a reference to their shared deck and their
+    position in it.
+    """
+
+    def __init__(self, ttl=3600, max_sessions=10000):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = Lock()
+
+    def create(self, session_id, deck_id, deck):
+        """
+        :param session_id: To specify the session
+        :param deck_id: To identify the deck in every process
+        :param deck: Shuffled questions IDs, shared by sessions
+        """
+
+        offset, stride = session_order(len(deck))
+
+        with self._lock:
+            self._sessions[session_id] = [
+                deck,
+                offset,
+                stride,
+                0,
+                time.monotonic(),
+            ]
+
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def pop(self, session_id):
+        """
+        :param session_id: To specify the session
+        :return: next question id, or None if all questions were played
+        :raise KeyError: if the session doesn't exist or has expired
+        """
+
+        with self._lock:
+            session = self._sessions[session_id]
+            deck, offset, stride, played, used_at = session
+
+            if time.monotonic() - used_at > self.ttl:
+                del self._sessions[session_id]
+                raise KeyError(session_id)
+
+            session[3:] = [min(played + 1, len(deck)), time.monotonic()]
+            self._sessions.move_to_end(session_id)
+
+        if played >= len(deck):
+            return None
+
+        return deck[session_position(len(deck), offset, stride, played)]
+
+
+class RedisSessionStore:
+    """
+    Keeps quiz sessions in Redis (or any client with the same commands),
+    to share them between processes. Every deck is stored once, packed,
+    for all of its sessions, and a session only keeps its order and
+    the number of questions played.
+    """
+
+    def __init__(self, client, ttl=3600, prefix="trivia:quiz:"):
+        # Redis only expires keys after a whole number of seconds
+        if not isinstance(ttl, int) or ttl < 1:
+            raise ValueError(
+                f"Quiz sessions kept in Redis need a ttl of at least "
+                f"1 whole second, not {ttl!r}"
+            )
+
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def _keys(self, session_id):
+        # The counter of played questions is increased atomically
+        return (
+            f"{self.prefix}{session_id}",
+            f"{self.prefix}{session_id}:played",
+        )
+
+    def _deck_key(self, deck_id):
+        return f"{self.prefix}deck:{deck_id}"
+
+    def create(self, session_id, deck_id, deck):
+        session_key, played_key = self._keys(session_id)
+        deck_key = self._deck_key(deck_id)
+
+        # Store the deck only if no other session stored it yet
+        if not self.client.expire(deck_key, self.ttl):
+            self.client.set(deck_key, array("q", deck).tobytes(), ex=self.ttl)
+
+        offset, stride = session_order(len(deck))
+        self.client.set(
+            session_key,
+            f"{len(deck)}:{offset}:{stride}:{deck_id}",
+            ex=self.ttl,
+        )
+        self.client.set(played_key, 0, ex=self.ttl)
+
+    def pop(self, session_id):
+        session_key, played_key = self._keys(session_id)
+        session = self.client.get(session_key)
+
+        if session is None:
+            raise KeyError(session_id)
+
+        length, offset, stride, deck_id = session.decode().split(":", 3)
+        length, offset, stride = int(length), int(offset), int(stride)
+        deck_key = self._deck_key(deck_id)
+
+        played = self.client.incr(played_key) - 1
+
+        for key in (session_key, played_key, deck_key):
+            self.client.expire(key, self.ttl)
+
+        if played >= length:
+            return None
+
+        start = ITEM.size * session_position(length, offset, stride, played)
+        item = self.client.getrange(deck_key, start, start + ITEM.size - 1)
+
+        if len(item) != ITEM.size:
+            raise KeyError(session_id)
+
+        return ITEM.unpack(item)[0]
+
+
+class LocalRedis:
+    """
+    In-process stand-in for the Redis commands used by RedisSessionStore,
+    for running without a Redis server
+    """
+
+    def __init__(self):
+        self._values = {}
+        self._expires_at = {}
+        self._lock = Lock()
+
+    def _get(self, key):
+        if self._expires_at.get(key, float("inf")) <= time.monotonic():
+            self._values.pop(key, None)
+            self._expires_at.pop(key, None)
+
+        return self._values.get(key)
+
+    def get(self, key):
+        with self._lock:
+            return self._get(key)
+
+    @staticmethod
+    def _check_seconds(seconds, command):
+        # Same as Redis, which rejects these instead of ignoring them
+        if not isinstance(seconds, int):
+            raise ValueError("value is not an integer or out of range")
+
+        if command == "set" and seconds < 1:
+            raise ValueError("invalid expire time in 'set' command")
+
+    def set(self, key, value, ex=None):
+        if ex is not None:
+            self._check_seconds(ex, "set")
+
+        with self._lock:
+            self._values[key] = (
+                value if isinstance(value, bytes) else str(value).encode()
+            )
+            self._expires_at.pop(key, None)
+
+            if ex is not None:
+                self._expires_at[key] = time.monotonic() + ex
+
+            return True
+
+    def getrange(self, key, start, end):
+        with self._lock:
+            return (self._get(key) or b"")[start : end + 1]
+
+    def incr(self, key):
+        with self._lock:
+            value = int(self._get(key) or 0) + 1
+            self._values[key] = str(value).encode()
+            return value
+
+    def expire(self, key, seconds):
+        self._check_seconds(seconds, "expire")
+
+        with self._lock:
+            if self._get(key) is None:
+                return False
+
+            self._expires_at[key] = time.monotonic() + seconds
+            return True
+
+
+def create_session_store(name, ttl=3600, max_sessions=10000, redis_url=None):
+    """
+    :param name: "memory" [default] or "redis"
+    :param ttl: Seconds to keep idle sessions
+    :param max_sessions: Max number of sessions kept in memory
+    :param redis_url: URL of the Redis server, a local stand-in is used
+        if not provided
+    :return: Session store
+    """
+
+    if name == "memory":
+        return MemorySessionStore(ttl=ttl, max_sessions=max_sessions)
+
+    if name == "redis":
+        if redis_url:
+            # Redis client is only needed with a Redis server
+            import redis
+
+            return RedisSessionStore(redis.Redis.from_url(redis_url), ttl)
+
+        return RedisSessionStore(LocalRedis(), ttl)
+
+    raise ValueError(f"Unknown quiz session store: {name}")
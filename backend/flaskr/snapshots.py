@@ -0,0 +1,457 @@
+import bisect
+import hashlib
+import mmap
+import os
+import random
+import struct
+import tempfile
+import threading
+from array import array
+from models import db, Question, versions
+from .replicas import use_primary
+
+# File layout: header, an entry per category, an entry per difficulty
+# of every category (stratum), then the arrays of questions IDs,
+# categories IDs and difficulties in id order, and the questions IDs
+# grouped by category then difficulty, which the entries point into
+MAGIC = b"TRIVSNAP"
+HEADER = struct.Struct("<8sQQQQ")
+CATEGORY = struct.Struct("<qQQ")
+STRATUM = struct.Struct("<qqQQ")
+
+# Number of random tries of a pick before listing the remaining questions
+PICK_TRIES = 8
+
+
+def read_questions():
+    """
+    :return: (array of questions IDs, array of categories IDs,
+        array of difficulties), in id order
+    """
+
+    ids, categories, difficulties = array("q"), array("q"), array("q")
+
+    # Read from the primary, replicas may not have the changes yet
+    with use_primary():
+        rows = db.session.query(
+            Question.id, Question.category_id, Question.difficulty
+        ).order_by(Question.id)
+
+        for question_id, category_id, difficulty in rows:
+            ids.append(question_id)
+            categories.append(category_id)
+            difficulties.append(difficulty)
+
+    return ids, categories, difficulties
+
+
+def pack_snapshot(ids, categories, difficulties):
+    """
+    :param ids: Array of questions IDs, in id order
+    :param categories: Array of the categories IDs of the questions
+    :param difficulties: Array of the difficulties of the questions
+    :return: (version, bytes of the snapshot file)
+    """
+
+    order = sorted(
+        range(len(ids)), key=lambda row: (categories[row], difficulties[row])
+    )
+    grouped = array("q", (ids[row] for row in order))
+
+    category_entries = []
+    stratum_entries = []
+
+    for row_position, row in enumerate(order):
+        category_id, difficulty = categories[row], difficulties[row]
+
+        if not category_entries or category_entries[-1][0] != category_id:
+            category_entries.append([category_id, row_position, 0])
+
+        if not stratum_entries or stratum_entries[-1][:2] != [
+            category_id,
+            difficulty,
+        ]:
+            stratum_entries.append([category_id, difficulty, row_position, 0])
+
+        category_entries[-1][2] += 1
+        stratum_entries[-1][3] += 1
+
+    # Offsets of the arrays are counted in 8 bytes items
+    start = (
+        HEADER.size
+        + CATEGORY.size * len(category_entries)
+        + STRATUM.size * len(stratum_entries)
+    ) // 8 + 3 * len(ids)
+
+    body = b"".join(
+        [
+            CATEGORY.pack(category_id, start + offset, length)
+            for category_id, offset, length in category_entries
+        ]
+        + [
+            STRATUM.pack(category_id, difficulty, start + offset, length)
+            for category_id, difficulty, offset, length in stratum_entries
+        ]
+        + [ids.tobytes(), categories.tobytes(), difficulties.tobytes()]
+        + [grouped.tobytes()]
+    )
+
+    # Same questions make the same version in every process
+    version = int.from_bytes(
+        hashlib.blake2b(body, digest_size=8).digest(), "little"
+    )
+    header = HEADER.pack(
+        MAGIC,
+        version,
+        len(ids),
+        len(category_entries),
+        len(stratum_entries),
+    )
+
+    return version, header + body
+
+
+def read_version(path):
+    """
+    :return: version of a snapshot file, or None if there is none
+    """
+
+    try:
+        with open(path, "rb") as file:
+            magic, version, *_ = HEADER.unpack(file.read(HEADER.size))
+
+    except (FileNotFoundError, struct.error):
+        return None
+
+    return version if magic == MAGIC else None
+
+
+def write_snapshot(path):
+    """
+    Writes a snapshot of the questions from the database, replacing
+    the snapshot file at once, so readers never see it partly
+
+    :return: (version, whether the file was replaced), it's kept
+        as it is if the questions haven't changed
+    """
+
+    version, content = pack_snapshot(*read_questions())
+
+    if read_version(path) == version:
+        return version, False
+
+    directory = os.path.dirname(os.path.abspath(path))
+
+    with tempfile.NamedTemporaryFile(
+        "wb", dir=directory, prefix=".snapshot-", delete=False
+    ) as file:
+        file.write(content)
+
+    os.replace(file.name, path)
+
+    return version, True
+
+
+class Snapshot:
+    """Questions of a snapshot file mapped read-only in memory"""
+
+    def __init__(self, path):
+        with open(path, "rb") as file:
+            stat = os.fstat(file.fileno())
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.version, count, categories, strata = HEADER.unpack_from(
+            mapped, 0
+        )
+
+        if magic != MAGIC:
+            raise ValueError(f"Not a snapshot file: {path}")
+
+        self.signature = (stat.st_ino, stat.st_mtime_ns)
+        items = memoryview(mapped).cast("q")
+        position = HEADER.size
+
+        self.categories = {}
+
+        for _ in range(categories):
+            category_id, offset, length = CATEGORY.unpack_from(
+                mapped, position
+            )
+            self.categories[category_id] = items[offset : offset + length]
+            position += CATEGORY.size
+
+        self.strata = {}
+
+        for _ in range(strata):
+            category_id, difficulty, offset, length = STRATUM.unpack_from(
+                mapped, position
+            )
+            self.strata[(category_id, difficulty)] = items[
+                offset : offset + length
+            ]
+            position += STRATUM.size
+
+        start = position // 8
+        self.ids = items[start : start + count]
+        self.categories_ids = items[start + count : start + 2 * count]
+        self.difficulties = items[start + 2 * count : start + 3 * count]
+
+    def row(self, question_id):
+        """
+        :return: position of a question in the arrays, or None
+        """
+
+        position = bisect.bisect_left(self.ids, question_id)
+
+        if position < len(self.ids) and self.ids[position] == question_id:
+            return position
+
+        return None
+
+
+class SnapshotIndex:
+    """
+    Serves the questions IDs of every category, and of every
+    difficulty of every category, from a snapshot file mapped in memory,
+    so drawing quiz questions and counting questions never query the
+    database, and the memory is shared by every process mapping it.
+    The snapshot is rebuilt by a SnapshotRefresher, woken up whenever
+    this process changes questions, and swapped in when a request starts
+    if the file was replaced.
+    """
+
+    def __init__(self, path, refresher=None):
+        """
+        :param path: Snapshot file, written from the database
+            if it doesn't exist yet
+        :param refresher: SnapshotRefresher rewriting the snapshot
+            after this process changed questions [optional]
+        """
+
+        self.path = path
+        self.refresher = refresher
+        self._snapshot = None
+        self._changes = versions.get(Question.__tablename__, 0)
+        self._lock = threading.Lock()
+
+    def check(self):
+        """
+        Has the snapshot rewritten if this process changed questions,
+        and maps the snapshot file again if it was replaced
+        """
+
+        changes = versions.get(Question.__tablename__, 0)
+
+        if changes != self._changes:
+            self._changes = changes
+
+            if self.refresher is not None:
+                self.refresher.wake()
+
+        try:
+            stat = os.stat(self.path)
+
+        except FileNotFoundError:
+            return
+
+        if (
+            self._snapshot is None
+            or (stat.st_ino, stat.st_mtime_ns) != self._snapshot.signature
+        ):
+            self._snapshot = Snapshot(self.path)
+
+    def get(self):
+        if self._snapshot is None:
+            with self._lock:
+                self.check()
+
+                if self._snapshot is None:
+                    write_snapshot(self.path)
+                    self.check()
+
+        return self._snapshot
+
+    def version(self):
+        return self.get().version
+
+    def generation(self):
+        return self.version()
+
+    def ids(self, category_id, difficulty=None):
+        if difficulty is not None:
+            return self.get().strata.get((category_id, difficulty), ())
+
+        return self.get().categories.get(category_id, ())
+
+    def segments(self, category_id=None, difficulty=None):
+        """
+        :return: list of sequences of the IDs of a category,
+            or of all categories, and of a difficulty if specified
+        """
+
+        if category_id:
+            return [self.ids(category_id, difficulty)]
+
+        if difficulty is not None:
+            return [
+                stratum_ids
+                for (_, stratum_difficulty), stratum_ids in (
+                    self.get().strata.items()
+                )
+                if stratum_difficulty == difficulty
+            ]
+
+        return [self.get().ids]
+
+    def all_ids(self, difficulty=None):
+        return [
+            question_id
+            for segment in self.segments(difficulty=difficulty)
+            for question_id in segment
+        ]
+
+    def snapshot(self):
+        """
+        IDs are the mapped arrays, so they're read without being copied
+
+        :return: (dict of {category id: IDs},
+            dict of {(category id, difficulty): IDs})
+        """
+
+        snapshot = self.get()
+
+        return snapshot.categories, snapshot.strata
+
+    def contains(self, question_id, category_id=None, difficulty=None):
+        snapshot = self.get()
+        row = snapshot.row(question_id)
+
+        return (
+            row is not None
+            and (
+                not category_id or snapshot.categories_ids[row] == category_id
+            )
+            and (
+                difficulty is None or snapshot.difficulties[row] == difficulty
+            )
+        )
+
+    def count(self, category_id, difficulty=None):
+        return len(self.ids(category_id, difficulty))
+
+    def total(self):
+        return len(self.get().ids)
+
+    def pick(self, category_id=None, exclude=(), difficulty=None):
+        """
+        Draws a question id uniformly from the ids of a category,
+        or of all categories, that are not in exclude
+
+        :param category_id: To specify a category [optional]
+        :param exclude: IDs of questions to be skipped
+        :param difficulty: To specify a difficulty [optional]
+        :return: question id, or None if every question is excluded
+        """
+
+        segments = self.segments(category_id, difficulty)
+        total = sum(len(segment) for segment in segments)
+        exclude = set(exclude)
+
+        if not total:
+            return None
+
+        # Most questions are left to be played, so a few random tries
+        # find one without reading the whole segments
+        for _ in range(PICK_TRIES):
+            position = random.randrange(total)
+
+            for segment in segments:
+                if position < len(segment):
+                    break
+
+                position -= len(segment)
+
+            if segment[position] not in exclude:
+                return segment[position]
+
+        remaining = [
+            question_id
+            for segment in segments
+            for question_id in segment
+            if question_id not in exclude
+        ]
+
+        return random.choice(remaining) if remaining else None
+
+
+class SnapshotRefresher:
+    """
+    Rewrites a snapshot file from the database every interval seconds,
+    and whenever it's woken up, in a background thread, so a single
+    process keeps the snapshot current for every process mapping it
+    """
+
+    def __init__(self, app, path, interval=5):
+        """
+        :param app: Flask app
+        :param path: Snapshot file
+        :param interval: Seconds between rewrites
+            [optional, default=5, None: only when woken up]
+        """
+
+        self.app = app
+        self.path = path
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._woken = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """
+        :return: (version, whether the file was replaced)
+        """
+
+        with self.app.app_context():
+            try:
+                return write_snapshot(self.path)
+
+            finally:
+                db.session.remove()
+
+    def run(self):
+        while not self._stopped.is_set():
+            # Wake-ups during the rewrite trigger another one
+            self._woken.clear()
+
+            try:
+                version, replaced = self.refresh()
+
+                if replaced:
+                    self.app.logger.info(f"Snapshot {version:016x} written")
+
+            except Exception:
+                self.app.logger.exception("Failed to refresh the snapshot")
+
+            self._woken.wait(self.interval)
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self.run, name="trivia-snapshot", daemon=True
+                )
+                self._thread.start()
+
+    def wake(self):
+        """Rewrites the snapshot now, starting the thread if needed"""
+
+        self._woken.set()
+        self.start()
+
+    def stop(self, timeout=None):
+        self._stopped.set()
+        self._woken.set()
+
+        if self._thread is not None:
+            self._thread.join(timeout)
@@ -1,6 +1,13 @@
+import json
+import sys
 from flask_script import Manager
 from flask_migrate import Migrate, MigrateCommand
 from flaskr import create_app, db
+from flaskr.bulk import read_rows, import_questions
+from flaskr.explain import check_plans
+from flaskr.helpers import parse_ids
+from flaskr.mutations import mutate_questions
+from flaskr.snapshots import SnapshotRefresher
 
 app = create_app("flaskr/development.py")
 
@@ -9,5 +16,131 @@ manager = Manager(app)
 
 manager.add_command('db', MigrateCommand)
 
+
+@manager.option('path', help='JSON Lines (.jsonl) or CSV (.csv) file')
+@manager.option('-b', '--batch-size', dest='batch_size', type=int,
+                default=5000, help='Number of rows inserted at once')
+@manager.option('-f', '--format', dest='input_format', default=None,
+                help='jsonl or csv (default: by file extension)')
+def import_file(path, batch_size, input_format):
+    """Imports questions from a JSON Lines or CSV file"""
+
+    input_format = input_format or (
+        'csv' if path.endswith('.csv') else 'jsonl'
+    )
+
+    if batch_size < 1:
+        print('error: --batch-size must be at least 1')
+        sys.exit(1)
+
+    with open(path, encoding='utf-8', newline='') as stream:
+        report = import_questions(
+            read_rows(stream, input_format), batch_size=batch_size
+        )
+
+    for error in report['errors']:
+        print(f"line {error['line']}: {error['error']}")
+
+    print(f"{report['inserted']} questions inserted, "
+          f"{report['failed']} rows failed")
+
+
+@manager.option('action', help='delete or recategorize')
+@manager.option('--ids', dest='ids', default=None,
+                help='Comma separated questions IDs')
+@manager.option('--category', dest='category_id', type=int, default=None,
+                help='Select questions of a category')
+@manager.option('--difficulty', dest='difficulty', type=int, default=None,
+                help='Select questions of a difficulty')
+@manager.option('--min-id', dest='min_id', type=int, default=None,
+                help='Select questions from this id')
+@manager.option('--max-id', dest='max_id', type=int, default=None,
+                help='Select questions up to this id')
+@manager.option('--to-category', dest='to_category_id', type=int,
+                default=None, help='Category to move the questions to')
+@manager.option('-n', '--dry-run', dest='dry_run', action='store_true',
+                help='Count the selected questions without changing them')
+def batch(action, ids, category_id, difficulty, min_id, max_id,
+          to_category_id, dry_run):
+    """Deletes or re-categorizes many questions in a single transaction"""
+
+    filters = {
+        name: value
+        for name, value in (
+            ('category_id', category_id),
+            ('difficulty', difficulty),
+            ('min_id', min_id),
+            ('max_id', max_id),
+        )
+        if value is not None
+    }
+
+    try:
+        report = mutate_questions(
+            action,
+            ids=parse_ids(ids) if ids is not None else None,
+            filters=filters,
+            to_category_id=to_category_id,
+            dry_run=dry_run,
+        )
+
+    except ValueError as error:
+        print(f"error: {error}")
+        sys.exit(1)
+
+    verb = 'would be' if dry_run else 'were'
+    print(f"{report['affected']} questions {verb} affected by {action}")
+
+
+@manager.option('-v', '--verbose', dest='verbose', action='store_true',
+                help='Print the plan of every query')
+def explain(verbose):
+    """Explains the queries of the endpoints and flags sequential scans"""
+
+    results = check_plans()
+
+    for result in results:
+        scans = result['sequential_scans']
+        status = f"SEQUENTIAL SCAN of {', '.join(scans)}" if scans else 'ok'
+        print(f"{result['query']}: {status}")
+
+        if verbose:
+            print(json.dumps(result['plan'], indent=4))
+
+    # Fail, for e.g., in CI, when an index is missing
+    if any(result['sequential_scans'] for result in results):
+        sys.exit(1)
+
+
+@manager.option('-p', '--path', dest='path', default=None,
+                help='Snapshot file (default: QUESTION_SNAPSHOT_PATH)')
+@manager.option('-i', '--interval', dest='interval', type=float,
+                default=None,
+                help='Keep rewriting the snapshot every interval seconds')
+def snapshot(path, interval):
+    """Writes the snapshot of questions mapped by every server process"""
+
+    path = path or app.config.get('QUESTION_SNAPSHOT_PATH')
+
+    if not path:
+        print('error: no --path and no QUESTION_SNAPSHOT_PATH configured')
+        sys.exit(1)
+
+    refresher = SnapshotRefresher(app, path, interval=interval)
+
+    if interval is None:
+        version, replaced = refresher.refresh()
+        status = 'written' if replaced else 'unchanged'
+        print(f"snapshot {version:016x} {status}: {path}")
+        return
+
+    # Run the refresher in the foreground until interrupted
+    try:
+        refresher.run()
+
+    except KeyboardInterrupt:
+        pass
+
+
 if __name__ == '__main__':
     manager.run()
@@ -0,0 +1,62 @@
+"""add questions search indexes
+
+Revision ID: 21ca35f9d024
+Revises: bb2a0a11b5da
+Create Date: 2026-10-18 02:06:02.703205
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '21ca35f9d024'
+down_revision = 'bb2a0a11b5da'
+branch_labels = None
+depends_on = None
+
+
+# Expressions must match the ones used by flaskr/search.py
+# to let the planner pick these indexes
+QUESTION_DOCUMENT = "to_tsvector('english'::regconfig, question)"
+QUESTION_ANSWER_DOCUMENT = (
+    "to_tsvector('english'::regconfig, question || ' ' || answer)"
+)
+
+
+def upgrade():
+    # These indexes are PostgreSQL only, other databases
+    # are searched by the in-process inverted index
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    # Trigram indexes speed up the ilike search
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.execute(
+        'CREATE INDEX ix_questions_question_trgm '
+        'ON questions USING gin (question gin_trgm_ops)'
+    )
+    op.execute(
+        'CREATE INDEX ix_questions_answer_trgm '
+        'ON questions USING gin (answer gin_trgm_ops)'
+    )
+
+    # Full text indexes serve the ranked search
+    op.execute(
+        'CREATE INDEX ix_questions_question_fts '
+        f'ON questions USING gin ({QUESTION_DOCUMENT})'
+    )
+    op.execute(
+        'CREATE INDEX ix_questions_question_answer_fts '
+        f'ON questions USING gin ({QUESTION_ANSWER_DOCUMENT})'
+    )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.drop_index('ix_questions_question_answer_fts', table_name='questions')
+    op.drop_index('ix_questions_question_fts', table_name='questions')
+    op.drop_index('ix_questions_answer_trgm', table_name='questions')
+    op.drop_index('ix_questions_question_trgm', table_name='questions')
@@ -0,0 +1,31 @@
+"""add questions category index
+
+Revision ID: 6f3c2a9d1b47
+Revises: 21ca35f9d024
+Create Date: 2026-10-18 09:41:17.520392
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6f3c2a9d1b47'
+down_revision = '21ca35f9d024'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Pages and counts of a category filter on category_id and order by id,
+    # and the in-memory questions index reads (id, category_id) only,
+    # so this index serves all of them without touching the table
+    op.create_index(
+        'ix_questions_category_id_id',
+        'questions',
+        ['category_id', 'id'],
+    )
+
+
+def downgrade():
+    op.drop_index('ix_questions_category_id_id', table_name='questions')
@@ -0,0 +1,39 @@
+"""cover questions difficulty by the category index
+
+Revision ID: 8d41b7e2c9a3
+Revises: 6f3c2a9d1b47
+Create Date: 2026-10-18 14:02:51.183604
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d41b7e2c9a3'
+down_revision = '6f3c2a9d1b47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The in-memory questions index now buckets questions by difficulty
+    # too, so the index covers (id, category_id, difficulty), keeping
+    # the category_id, id order of pages and counts
+    op.create_index(
+        'ix_questions_category_id_id_difficulty',
+        'questions',
+        ['category_id', 'id', 'difficulty'],
+    )
+    op.drop_index('ix_questions_category_id_id', table_name='questions')
+
+
+def downgrade():
+    op.create_index(
+        'ix_questions_category_id_id',
+        'questions',
+        ['category_id', 'id'],
+    )
+    op.drop_index(
+        'ix_questions_category_id_id_difficulty', table_name='questions'
+    )
@@ -1,6 +1,34 @@
-from flask_sqlalchemy import SQLAlchemy
+from collections import deque, namedtuple
+from itertools import chain
+from threading import Lock
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import event, inspect, orm
 
-db = SQLAlchemy()
+
+class RoutingSession(SignallingSession):
+    """
+    Session reading from the engine picked by the read router of the app
+    (e.g. a read replica), while flushes always write to the primary
+    """
+
+    def get_bind(self, mapper=None, clause=None):
+        router = self.app.extensions.get('read_replicas')
+
+        if router is not None and not self._flushing:
+            engine = router.read_engine()
+
+            if engine is not None:
+                return engine
+
+        return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+db = RoutingSQLAlchemy()
 
 '''
 Question
@@ -11,6 +39,15 @@ Question
 class Question(db.Model):
     __tablename__ = 'questions'
 
+    # Serves the questions of a category in id order (pages, cursors,
+    # counts) and covers reading all (id, category_id, difficulty)
+    __table_args__ = (
+        db.Index(
+            'ix_questions_category_id_id_difficulty',
+            'category_id', 'id', 'difficulty',
+        ),
+    )
+
     id = db.Column(
         db.Integer,
         primary_key=True
@@ -93,3 +130,123 @@ class Category(db.Model):
             'id': self.id,
             'type': self.type
         }
+
+
+'''
+Change Tracking
+
+'''
+
+# Version of each table, bumped on every commit that changes its rows
+versions = {
+    Question.__tablename__: 0,
+    Category.__tablename__: 0,
+}
+
+# Recent (version, row changes) of each table, to let in-process caches
+# apply the changes instead of reloading the table,
+# row changes are None if they are unknown (e.g. bulk statements)
+changelogs = {table: deque(maxlen=1000) for table in versions}
+
+versions_lock = Lock()
+
+# Change of a row, old values are None on insert and new values on delete
+RowChange = namedtuple('RowChange', ['id', 'old', 'new'])
+
+
+def bump_versions(*tables, changes=None):
+    """
+    :param tables: Names of the changed tables
+    :param changes: Dict of {table: list of RowChange} [optional]
+    """
+
+    changes = changes or {}
+
+    with versions_lock:
+        for table in tables:
+            versions[table] = versions.get(table, 0) + 1
+            changelogs.setdefault(table, deque(maxlen=1000)).append(
+                (versions[table], changes.get(table))
+            )
+
+
+def changes_since(table, version, until):
+    """
+    :return: list of RowChange committed to table after version
+        up to until version, or None if some of them are unknown
+    """
+
+    entries = [
+        row_changes
+        for entry_version, row_changes in list(changelogs.get(table, ()))
+        if version < entry_version <= until
+    ]
+
+    if len(entries) != until - version or None in entries:
+        return None
+
+    return [change for row_changes in entries for change in row_changes]
+
+
+def row_values(instance, old):
+    # Read the loaded values of an instance before or after the flush
+    state = inspect(instance)
+    values = {}
+
+    for attr in state.mapper.column_attrs:
+        history = state.attrs[attr.key].history
+        candidates = (
+            (history.deleted or history.unchanged)
+            if old
+            else (history.added or history.unchanged)
+        )
+
+        if not candidates:
+            return None
+
+        values[attr.key] = candidates[0]
+
+    return values
+
+
+@event.listens_for(db.session, 'after_flush')
+def track_changes(session, flush_context):
+    changes = session.info.setdefault('changes', {})
+
+    flushed = chain(
+        ((instance, False, True) for instance in session.new),
+        ((instance, True, True) for instance in session.dirty),
+        ((instance, True, False) for instance in session.deleted),
+    )
+
+    for instance, has_old, has_new in flushed:
+        if has_old and has_new and not session.is_modified(instance):
+            continue
+
+        table = instance.__tablename__
+        old = row_values(instance, old=True) if has_old else {}
+        new = row_values(instance, old=False) if has_new else {}
+
+        # Changes of a table become unknown once one of them is
+        if old is None or new is None or changes.get(table, []) is None:
+            changes[table] = None
+            continue
+
+        changes.setdefault(table, []).append(
+            RowChange(
+                id=(new if has_new else old)['id'],
+                old=old if has_old else None,
+                new=new if has_new else None,
+            )
+        )
+
+
+@event.listens_for(db.session, 'after_commit')
+def publish_changes(session):
+    changes = session.info.pop('changes', {})
+    bump_versions(*changes, changes=changes)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def discard_changes(session):
+    session.info.pop('changes', None)
@@ -1,6 +1,33 @@
+import asyncio
+import gzip
+import json
+import os
+import tempfile
+import time
 import unittest
+from array import array
 from math import ceil
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+from werkzeug.test import EnvironBuilder
+from models import versions
 from flaskr import create_app, db, Category, Question
+from flaskr.asgi import WSGIToASGI
+from flaskr.database import TimedQueuePool
+from flaskr.decks import DeckStore, ALL_CATEGORIES
+from flaskr.explain import check_plans, sequential_scans
+from flaskr.helpers import with_category
+from flaskr.read_models import QuestionRecord, fetch_page, stream_records
+from flaskr.selection import QuestionIndex
+from flaskr.search import LikeSearch, FullTextSearch, InvertedIndexSearch
+from flaskr.serializers import create_json_provider, orjson
+from flaskr.sessions import MemorySessionStore, RedisSessionStore, LocalRedis
+from flaskr.snapshots import (
+    SnapshotIndex,
+    SnapshotRefresher,
+    read_version,
+    write_snapshot,
+)
 
 
 class TriviaTestCase(unittest.TestCase):
@@ -48,6 +75,26 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data.get("total_questions"), total_questions)
         self.assertTrue(data.get("categories"))
 
+    def count_queries(self, send, *args, status=200, app=None, **kwargs):
+        """Sends a request on a fresh session and counts its SQL queries"""
+        statements = []
+
+        def count(conn, cursor, statement, parameters, context, many):
+            statements.append(statement)
+
+        engine = self.db.get_engine(app or self.app)
+        self.db.session.remove()
+        event.listen(engine, "before_cursor_execute", count)
+
+        try:
+            response = send(*args, **kwargs)
+
+        finally:
+            event.remove(engine, "before_cursor_execute", count)
+
+        self.assertEqual(response.status_code, status)
+        return len(statements)
+
     def step_0_get_all_categories(self):
         total_categories = Category.query.count()
 
@@ -263,10 +310,1431 @@ class TriviaTestCase(unittest.TestCase):
 
         self.check_status_422(response)
 
+    def step_10_post_play_without_repeats(self):
+        category = Category.query.order_by(self.db.func.random()).first()
+        total_questions = category.questions.count()
+        previous_questions_ids = []
+
+        for q_id in range(total_questions):
+            response = self.client().post(
+                "/quizzes",
+                json={
+                    "previous_questions_ids": previous_questions_ids,
+                    "quiz_category_id": category.id,
+                },
+            )
+            data = response.get_json()
+
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(
+                data.get("question").get("category").get("id"), category.id
+            )
+            self.assertNotIn(
+                data.get("question").get("id"), previous_questions_ids
+            )
+            previous_questions_ids.append(data.get("question").get("id"))
+
+        response = self.client().post(
+            "/quizzes",
+            json={
+                "previous_questions_ids": previous_questions_ids,
+                "quiz_category_id": category.id,
+            },
+        )
+        self.assertFalse(response.get_json().get("question"))
+
+        # A question added after the game started must be drawn next
+        question = Question(
+            question="<from_test>",
+            answer="<from_test>",
+            difficulty=1,
+            category_id=category.id,
+        )
+        question.add()
+
+        response = self.client().post(
+            "/quizzes",
+            json={
+                "previous_questions_ids": previous_questions_ids,
+                "quiz_category_id": category.id,
+            },
+        )
+        self.assertEqual(
+            response.get_json().get("question").get("id"), question.id
+        )
+
+        question.delete()
+
+    def step_11_constant_queries_per_page(self):
+        category = max(
+            Category.query.all(), key=lambda cat: cat.questions.count()
+        )
+
+        requests = [
+            (self.client().get, f"/categories/{category.id}/questions", {}),
+            (self.client().get, "/questions", {}),
+            (self.client().post, "/questions", {"json": {"search_term": "a"}}),
+        ]
+
+        for send, path, kwargs in requests:
+            queries_per_length = {
+                self.count_queries(
+                    send, path, query_string={"length": length}, **kwargs
+                )
+                for length in (1, 5, 50)
+            }
+
+            self.assertEqual(len(queries_per_length), 1, path)
+
+    def step_12_cached_categories(self):
+        self.client().get("/categories")
+        self.assertEqual(
+            self.count_queries(self.client().get, "/categories"), 0
+        )
+
+        # Changing categories must invalidate the cached ones
+        category = Category(type="<from_test>")
+        self.db.session.add(category)
+        self.db.session.commit()
+
+        response = self.client().get(f"/categories/{category.id}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.get_json().get("category").get("type"), "<from_test>"
+        )
+
+        self.db.session.delete(category)
+        self.db.session.commit()
+
+        response = self.client().get("/categories")
+        self.assertEqual(
+            len(response.get_json().get("categories")),
+            Category.query.count(),
+        )
+
+    def step_13_search_backends(self):
+        question = Question(
+            question="Which marsupial is called the quokka?",
+            answer="Setonix",
+            difficulty=1,
+            category_id=Category.query.first().id,
+        )
+        question.add()
+
+        backends = [LikeSearch(), InvertedIndexSearch()]
+
+        if self.db.get_engine(self.app).dialect.name == "postgresql":
+            backends.append(FullTextSearch())
+
+        for backend in backends:
+            results = backend.search("Quokka", offset=0, limit=10)
+            self.assertEqual(results.total, 1)
+            self.assertEqual(results.questions[0].id, question.id)
+
+            results = backend.search("setonix", offset=0, limit=10)
+            self.assertEqual(results.total, 0)
+
+            results = backend.search(
+                "setonix", offset=0, limit=10, search_answers=True
+            )
+            self.assertEqual(results.total, 1)
+
+            # Pages past the last one still report the total
+            results = backend.search("Quokka", offset=10, limit=10)
+            self.assertEqual((results.questions, results.total), ([], 1))
+
+        # Ranked search matches the last word as a prefix
+        for backend in backends[1:]:
+            results = backend.search("marsupial quo", 0, 10)
+            self.assertEqual(
+                [result.id for result in results.questions], [question.id]
+            )
+
+        question.delete()
+
+    def step_14_search_page_and_total_in_one_query(self):
+        search = {"search_term": "a"}
+        self.client().post("/questions", json=search)
+
+        self.assertEqual(
+            self.count_queries(self.client().post, "/questions", json=search),
+            1,
+        )
+
+    def step_15_cursor_pagination(self):
+        category = Category.query.order_by(self.db.func.random()).first()
+
+        paths = {
+            "/questions": Question.query,
+            f"/categories/{category.id}/questions": Question.query.filter(
+                Question.category_id == category.id
+            ),
+        }
+
+        for path, query in paths.items():
+            questions_ids = []
+            cursor = 0
+
+            while cursor is not None:
+                response = self.client().get(
+                    path, query_string={"after": cursor, "length": 4}
+                )
+                data = response.get_json()
+
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(data.get("total_questions"), query.count())
+                self.assertTrue(len(data.get("questions")) <= 4)
+                questions_ids.extend(q.get("id") for q in data["questions"])
+                cursor = data.get("next_cursor")
+
+            self.assertEqual(
+                questions_ids,
+                [question.id for question in query.order_by(Question.id)],
+            )
+
+            # A malformed cursor isn't taken for the first page
+            self.check_status_422(
+                self.client().get(path, query_string={"after": "abc"})
+            )
+
+            # Empty pages are empty in both modes
+            for query_string in [{"length": 0}, {"length": 0, "after": 0}]:
+                response = self.client().get(path, query_string=query_string)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.get_json()["questions"], [])
+                self.assertIsNone(response.get_json().get("next_cursor"))
+
+        self.assertEqual(fetch_page(0, 0, after=0), ([], None))
+
+    def step_16_maintained_counts(self):
+        categories_ids = [category.id for category in Category.query.limit(2)]
+        self.client().get("/questions")
+        queries = self.count_queries(self.client().get, "/questions")
+
+        def totals():
+            return [
+                self.client().get(path).get_json().get("total_questions")
+                for path in [
+                    "/questions",
+                    f"/categories/{categories_ids[0]}/questions",
+                    f"/categories/{categories_ids[1]}/questions",
+                ]
+            ]
+
+        initial_totals = totals()
+
+        question = Question(
+            question="<from_test>",
+            answer="<from_test>",
+            difficulty=1,
+            category_id=categories_ids[0],
+        )
+        question.add()
+        question_id = question.id
+
+        # Counts are updated without reloading the questions
+        self.assertEqual(
+            self.count_queries(self.client().get, "/questions"), queries
+        )
+        self.assertEqual(
+            totals(),
+            [
+                initial_totals[0] + 1,
+                initial_totals[1] + 1,
+                initial_totals[2],
+            ],
+        )
+
+        question = Question.query.get(question_id)
+        question.category_id = categories_ids[1]
+        self.db.session.commit()
+
+        self.assertEqual(
+            totals(),
+            [
+                initial_totals[0] + 1,
+                initial_totals[1],
+                initial_totals[2] + 1,
+            ],
+        )
+
+        Question.query.get(question_id).delete()
+        self.assertEqual(totals(), initial_totals)
+
+    def step_17_post_play_all_categories(self):
+        total_questions = Question.query.count()
+        previous_questions_ids = []
+        queries_per_turn = set()
+
+        for q_id in range(total_questions):
+            if previous_questions_ids:
+                queries_per_turn.add(
+                    self.count_queries(
+                        self.client().post,
+                        "/quizzes",
+                        json={
+                            "previous_questions_ids": previous_questions_ids
+                        },
+                    )
+                )
+
+            response = self.client().post(
+                "/quizzes",
+                json={"previous_questions_ids": previous_questions_ids},
+            )
+            data = response.get_json()
+
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn(
+                data.get("question").get("id"), previous_questions_ids
+            )
+            previous_questions_ids.append(data.get("question").get("id"))
+
+        # Queries don't grow with the number of previous questions
+        self.assertEqual(len(queries_per_turn), 1)
+
+        response = self.client().post(
+            "/quizzes",
+            json={"previous_questions_ids": previous_questions_ids},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.get_json().get("question"))
+
+    def step_18_post_play_quiz_session(self):
+        category = Category.query.order_by(self.db.func.random()).first()
+        total_questions = Question.query.filter(
+            Question.category_id == category.id
+        ).count()
+
+        response = self.client().post(
+            "/quizzes/sessions", json={"quiz_category_id": category.id}
+        )
+        data = response.get_json()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data.get("total_questions"), total_questions)
+
+        questions_ids = []
+        path = f"/quizzes/sessions/{data.get('session_id')}/next"
+
+        for q_id in range(total_questions):
+            response = self.client().post(path)
+            question = response.get_json().get("question")
+
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(question.get("category").get("id"), category.id)
+            questions_ids.append(question.get("id"))
+
+        self.assertEqual(len(set(questions_ids)), total_questions)
+
+        response = self.client().post(path)
+        self.assertFalse(response.get_json().get("question"))
+
+        response = self.client().post("/quizzes/sessions/fake-id/next")
+        self.check_status_404(response)
+
+    def step_19_quiz_session_stores(self):
+        deck = array("q", [3, 1, 2])
+        stores = [
+            MemorySessionStore(max_sessions=1),
+            RedisSessionStore(LocalRedis()),
+        ]
+
+        for store in stores:
+            store.create("first", "deck", deck)
+            store.create("second", "empty", array("q"))
+
+            self.assertEqual(store.pop("second"), None)
+            self.assertRaises(KeyError, store.pop, "fake-id")
+
+        # Least recently used sessions are dropped beyond max_sessions
+        self.assertRaises(KeyError, stores[0].pop, "first")
+
+        # Sessions play every question of their deck once, in an order
+        # of their own, sharing the deck with the other sessions
+        for store in [MemorySessionStore(), RedisSessionStore(LocalRedis())]:
+            orders = set()
+
+            for session_id in range(20):
+                store.create(session_id, "deck", deck)
+                played = [store.pop(session_id) for i in range(4)]
+
+                self.assertEqual(sorted(played[:3]), [1, 2, 3])
+                self.assertIsNone(played[3])
+                orders.add(tuple(played))
+
+            self.assertGreater(len(orders), 1)
+
+            # Decks are shared, not copied, by the sessions
+            if isinstance(store, MemorySessionStore):
+                self.assertIs(store._sessions[0][0], deck)
+
+            else:
+                self.assertEqual(
+                    [key for key in store.client._values if ":deck:" in key],
+                    ["trivia:quiz:deck:deck"],
+                )
+
+        # Idle sessions expire after their ttl, of whole seconds in Redis
+        stores = [
+            MemorySessionStore(ttl=0),
+            RedisSessionStore(LocalRedis(), ttl=1),
+        ]
+
+        for store in stores:
+            store.create("first", "deck", deck)
+
+        time.sleep(1.05)
+
+        for store in stores:
+            self.assertRaises(KeyError, store.pop, "first")
+
+        for ttl in [0, None, 0.5]:
+            self.assertRaises(
+                ValueError, RedisSessionStore, LocalRedis(), ttl=ttl
+            )
+
+        self.assertRaises(ValueError, LocalRedis().set, "key", 1, ex=0)
+        self.assertRaises(ValueError, LocalRedis().set, "key", 1, ex=0.5)
+
+    def step_20_post_bulk_questions(self):
+        category_id = Category.query.first().id
+        total_questions = Question.query.count()
+
+        bodies = {
+            "application/x-ndjson": "\n".join(
+                [
+                    f'{{"question": "<bulk_test>", "answer": "1", '
+                    f'"difficulty": 1, "category_id": {category_id}}}',
+                    '{"question": "<bulk_test>"}',
+                    f'{{"question": "<bulk_test>", "answer": "2", '
+                    f'"difficulty": 2, "category_id": {category_id}}}',
+                    "not json",
+                    f'{{"question": "<bulk_test>", "answer": "3", '
+                    f'"difficulty": 3, "category_id": {category_id}}}',
+                ]
+            ),
+            "text/csv": "\n".join(
+                [
+                    "question,answer,difficulty,category_id",
+                    f"<bulk_test>,1,1,{category_id}",
+                    f"<bulk_test>,2,hard,{category_id}",
+                    f"<bulk_test>,3,3,{category_id}",
+                    "<bulk_test>,4,4,0",
+                    f"<bulk_test>,5,5,{category_id}",
+                ]
+            ),
+        }
+
+        for content_type, body in bodies.items():
+            response = self.client().post(
+                "/questions/bulk",
+                query_string={"batch_size": 2},
+                data=body,
+                content_type=content_type,
+            )
+            data = response.get_json()
+
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(data.get("success_status"))
+            self.assertEqual(data.get("inserted"), 3)
+            self.assertEqual(data.get("failed"), 2)
+            self.assertEqual(
+                [error.get("line") for error in data.get("errors")],
+                [3, 5] if content_type == "text/csv" else [2, 4],
+            )
+
+            response = self.client().get("/questions")
+            self.assertEqual(
+                response.get_json().get("total_questions"),
+                total_questions + 3,
+            )
+
+            for question in Question.query.filter(
+                Question.question == "<bulk_test>"
+            ):
+                self.db.session.delete(question)
+
+            self.db.session.commit()
+
+        # JSON numbers must be integers, not floats or booleans
+        for difficulty in ("1.7", "true"):
+            data = (
+                self.client()
+                .post(
+                    "/questions/bulk",
+                    data=f'{{"question": "<bulk_test>", "answer": "1", '
+                    f'"difficulty": {difficulty}, '
+                    f'"category_id": {category_id}}}',
+                    content_type="application/x-ndjson",
+                )
+                .get_json()
+            )
+            self.assertEqual((data["inserted"], data["failed"]), (0, 1))
+
+        for batch_size in (0, -1, "abc"):
+            self.check_status_422(
+                self.client().post(
+                    "/questions/bulk",
+                    query_string={"batch_size": batch_size},
+                    data=bodies["text/csv"],
+                    content_type="text/csv",
+                )
+            )
+
+        self.assertEqual(Question.query.count(), total_questions)
+
+    def step_21_conditional_get(self):
+        question = Question.query.order_by(self.db.func.random()).first()
+        category_id = question.category_id
+        paths = [
+            "/categories",
+            f"/categories/{category_id}",
+            f"/categories/{category_id}/questions?page=1",
+            "/questions?length=5",
+            f"/questions/{question.id}",
+        ]
+
+        etags = {}
+
+        for path in paths:
+            response = self.client().get(path)
+            etags[path] = response.headers.get("ETag")
+
+            self.assertTrue(etags[path])
+            self.assertTrue(response.cache_control.must_revalidate)
+
+            # Unchanged resources are revalidated without the database
+            self.assertEqual(
+                self.count_queries(
+                    self.client().get,
+                    path,
+                    headers={"If-None-Match": etags[path]},
+                    status=304,
+                ),
+                0,
+            )
+
+        new_question = Question(
+            question="<from_test>",
+            answer="<from_test>",
+            difficulty=1,
+            category_id=category_id,
+        )
+        new_question.add()
+
+        try:
+            for path in paths:
+                response = self.client().get(
+                    path, headers={"If-None-Match": etags[path]}
+                )
+
+                # Only views listing questions are changed
+                # by adding a question
+                self.assertEqual(
+                    response.status_code,
+                    200 if path in paths[2:4] else 304,
+                )
+
+        finally:
+            new_question.delete()
+
+        # ETags are the same in every process, so another process
+        # revalidates the ETags of this one
+        for path in paths:
+            response = (
+                create_app("flaskr/testing.py")
+                .test_client()
+                .get(path, headers={"If-None-Match": etags[path]})
+            )
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.headers["ETag"], etags[path])
+
+        # Latest bodies can be served from memory as well
+        app = create_app("flaskr/testing.py", {"RESPONSE_CACHE_SIZE": 10})
+        body = app.test_client().get("/questions").get_data()
+
+        self.assertEqual(
+            self.count_queries(app.test_client().get, "/questions", app=app),
+            0,
+        )
+        self.assertEqual(app.test_client().get("/questions").get_data(), body)
+
+        # Changes of other processes change the ETag, and the bodies kept
+        # in memory, once the caches reload them
+        app = create_app(
+            "flaskr/testing.py",
+            {"RESPONSE_CACHE_SIZE": 10, "CATEGORY_CACHE_TTL": 0.2},
+        )
+        client = app.test_client()
+        response = client.get("/categories")
+        category_id = self.db.engine.execute(
+            Category.__table__.insert(), {"type": "<etag_test>"}
+        ).inserted_primary_key[0]
+
+        try:
+            self.assertEqual(
+                client.get("/categories").get_data(), response.get_data()
+            )
+            time.sleep(0.2)
+
+            fresh = client.get(
+                "/categories",
+                headers={"If-None-Match": response.headers["ETag"]},
+            )
+            self.assertEqual(fresh.status_code, 200)
+            self.assertIn(b"<etag_test>", fresh.get_data())
+
+        finally:
+            self.db.engine.execute(
+                Category.__table__.delete().where(Category.id == category_id)
+            )
+
+    def step_22_fast_serialization(self):
+        question = Question.query.order_by(self.db.func.random()).first()
+        paths = {
+            "/questions?length=50": Question.query,
+            f"/categories/{question.category_id}/questions": (
+                Question.query.filter(
+                    Question.category_id == question.category_id
+                )
+            ),
+        }
+
+        for path, query in paths.items():
+            data = self.client().get(path).get_json()
+            questions = (
+                with_category(query)
+                .order_by(Question.id)
+                .limit(len(data.get("questions")))
+                .all()
+            )
+
+            # Questions rows are formatted the same as ORM questions
+            self.assertEqual(
+                data.get("questions"),
+                [question.format() for question in questions],
+            )
+
+        names = ["stdlib"] + (["orjson"] if orjson is not None else [])
+        view = {"questions": data.get("questions"), "success_status": True}
+
+        for name in names:
+            app = create_app("flaskr/testing.py", {"JSON_PROVIDER": name})
+            response = app.test_client().get(path)
+
+            self.assertEqual(response.mimetype, "application/json")
+            self.assertEqual(response.get_json(), data)
+            self.assertEqual(
+                json.loads(create_json_provider(name).dumps(view)), view
+            )
+
+    def step_23_read_models(self):
+        question = Question.query.order_by(self.db.func.random()).first()
+        category_questions = Question.query.filter(
+            Question.category_id == question.category_id
+        ).order_by(Question.id)
+
+        records, next_cursor = fetch_page(
+            0, 3, after=0, category_id=question.category_id
+        )
+
+        # Records are plain tuples of the question columns
+        self.assertTrue(records)
+        self.assertFalse(hasattr(records[0], "__dict__"))
+        self.assertIsInstance(records[0], QuestionRecord)
+        self.assertEqual(
+            [record.id for record in records],
+            [question.id for question in category_questions.limit(3)],
+        )
+        first = Question.query.get(records[0].id)
+        self.assertEqual(
+            records[0],
+            (
+                first.id,
+                first.question,
+                first.answer,
+                first.difficulty,
+                first.category_id,
+            ),
+        )
+
+        if len(records) == 3 and category_questions.count() > 3:
+            self.assertEqual(next_cursor, records[-1].id)
+
+        # Every page is a single query without any ORM instance
+        self.assertEqual(
+            self.count_queries(self.client().get, "/questions?page=2"), 1
+        )
+        self.assertEqual(
+            self.count_queries(
+                self.client().get,
+                f"/categories/{question.category_id}/questions",
+            ),
+            1,
+        )
+
+    def step_24_instrumentation(self):
+        app = create_app(
+            "flaskr/testing.py",
+            {"INSTRUMENTATION": True, "SLOW_REQUEST_MS": 0},
+        )
+        client = app.test_client()
+        self.db.session.remove()
+
+        # Load in-memory caches first
+        client.get("/questions")
+
+        with self.assertLogs(app.logger, "WARNING") as logs:
+            response = client.get("/questions?page=2")
+
+        # Queries and timings are reported with the response
+        timing = response.headers.get("Server-Timing")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('desc="1 queries"', timing)
+        self.assertIn("serialize;dur=", timing)
+        self.assertIn("total;dur=", timing)
+        self.assertIn("/questions?page=2", logs.output[0])
+        self.assertIn("SELECT", logs.output[0])
+
+        client.get("/questions/0")
+        response = client.get("/metrics")
+        metrics = response.get_data(as_text=True)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "text/plain")
+        self.assertIn(
+            'trivia_requests_total{endpoint="questions",method="GET",'
+            'status="200"} 2',
+            metrics,
+        )
+        self.assertIn(
+            'trivia_db_queries_total{endpoint="questions",method="GET",'
+            'status="200"}',
+            metrics,
+        )
+        self.assertIn('endpoint="question",method="GET",status="404"', metrics)
+        self.assertIn(
+            'trivia_request_duration_seconds_bucket{endpoint="questions",'
+            'method="GET",status="200",le="+Inf"} 2',
+            metrics,
+        )
+
+        # Instrumentation is opt-in
+        self.assertIsNone(
+            self.client().get("/questions").headers.get("Server-Timing")
+        )
+        self.assertEqual(self.client().get("/metrics").status_code, 404)
+
+    def step_25_connection_pool(self):
+        app = create_app(
+            "flaskr/testing.py",
+            {
+                "DB_POOL_SIZE": 2,
+                "DB_MAX_OVERFLOW": 1,
+                "DB_POOL_TIMEOUT": 5,
+                "DB_POOL_RECYCLE": 600,
+                "DB_POOL_PRE_PING": True,
+                "DB_STATEMENT_TIMEOUT": 200,
+                "INSTRUMENTATION": True,
+            },
+        )
+        engine = self.db.get_engine(app)
+
+        self.assertIsInstance(engine.pool, TimedQueuePool)
+        self.assertEqual(engine.pool.size(), 2)
+        self.assertEqual(engine.pool._max_overflow, 1)
+        self.assertEqual(engine.pool._timeout, 5)
+        self.assertEqual(engine.pool._recycle, 600)
+        self.assertTrue(engine.pool._pre_ping)
+
+        # Endless statements are cancelled by the statement timeout
+        with engine.connect() as connection:
+            with self.assertRaises(OperationalError):
+                connection.execute(
+                    "WITH RECURSIVE numbers(n) AS (SELECT 1 UNION ALL "
+                    "SELECT n + 1 FROM numbers) SELECT count(*) FROM numbers"
+                ).scalar()
+
+            self.assertEqual(connection.execute("SELECT 1").scalar(), 1)
+
+            # Timings of the statements after it don't start from it
+            self.assertEqual(connection.info["query_start"], [])
+
+        # Pool checkouts are reported by the instrumentation
+        client = app.test_client()
+        self.db.session.remove()
+        response = client.get("/questions")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("pool;dur=", response.headers.get("Server-Timing"))
+
+        metrics = client.get("/metrics").get_data(as_text=True)
+        self.assertIn("trivia_db_pool_size 2", metrics)
+        self.assertIn("trivia_db_pool_checked_out", metrics)
+        self.assertIn("trivia_db_pool_wait_seconds_total{", metrics)
+
+    def step_26_quiz_decks(self):
+        category = Category.query.order_by(self.db.func.random()).first()
+        category_id = category.id
+        category_questions_ids = {
+            question_id
+            for question_id, in self.db.session.query(Question.id).filter(
+                Question.category_id == category_id
+            )
+        }
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "decks")
+            question_index = QuestionIndex()
+            decks = DeckStore(question_index, path=path)
+
+            # Decks are permutations of the questions IDs
+            self.assertEqual(
+                sorted(decks.get()[category_id]),
+                sorted(category_questions_ids),
+            )
+            self.assertEqual(
+                len(decks.get()[ALL_CATEGORIES]), Question.query.count()
+            )
+
+            # Other processes map the same decks from the file
+            self.assertEqual(
+                list(DeckStore(QuestionIndex(), path=path).get()[category_id]),
+                list(decks.get()[category_id]),
+            )
+
+            played = []
+
+            for _ in category_questions_ids:
+                played.append(decks.draw(category_id, played))
+
+            self.assertEqual(set(played), category_questions_ids)
+            self.assertIsNone(decks.draw(category_id, played))
+
+            # Decks are reshuffled in the background on changes
+            question = Question(
+                question="<deck_test>",
+                answer="<deck_test>",
+                difficulty=1,
+                category_id=category_id,
+            )
+            question.add()
+            question_id = question.id
+
+            self.assertEqual(decks.draw(category_id, played), question_id)
+
+            decks.wait()
+            self.assertIn(question_id, decks.get()[category_id])
+
+            question.delete()
+            self.assertIsNone(decks.draw(category_id, played))
+            decks.wait()
+
+        # A quiz turn only fetches the drawn question
+        self.client().post("/quizzes", json={"previous_questions_ids": []})
+        self.assertEqual(
+            self.count_queries(
+                self.client().post,
+                "/quizzes",
+                json={
+                    "previous_questions_ids": played[1:],
+                    "quiz_category_id": category_id,
+                },
+            ),
+            1,
+        )
+
+    def step_27_query_plans(self):
+        results = check_plans()
+
+        self.assertIn(
+            "GET /categories/<id>/questions",
+            [result["query"] for result in results],
+        )
+
+        # Every query of the endpoints is served by an index
+        for result in results:
+            self.assertEqual(result["sequential_scans"], [], result["query"])
+
+        # A missing index is flagged
+        self.assertEqual(
+            sequential_scans(
+                {
+                    "Node Type": "Aggregate",
+                    "Plans": [
+                        {"Node Type": "Seq Scan", "Relation Name": "questions"}
+                    ],
+                }
+            ),
+            ["questions"],
+        )
+
+    def step_28_read_replicas(self):
+        category_id = Category.query.first().id
+        self.db.session.remove()
+
+        with tempfile.TemporaryDirectory() as directory:
+            replica_uri = "sqlite:///" + os.path.join(directory, "replica.db")
+            down_uri = "sqlite:///" + os.path.join(directory, "down", "db")
+            app = create_app(
+                "flaskr/testing.py",
+                {
+                    "DB_REPLICAS": [down_uri, replica_uri],
+                    "DB_READ_YOUR_WRITES": 60,
+                    "RESPONSE_CACHE_SIZE": 10,
+                },
+            )
+            replica = self.db.get_engine(app, bind="replica_2")
+
+            # Fill the replica with a question the primary doesn't have
+            self.db.metadata.create_all(replica)
+            replica.execute(
+                Category.__table__.insert(),
+                [
+                    {"id": category.id, "type": category.type}
+                    for category in Category.query.all()
+                ],
+            )
+            replica_question_id = (
+                self.db.session.query(self.db.func.max(Question.id)).scalar()
+                + 1000
+            )
+            replica.execute(
+                Question.__table__.insert(),
+                {
+                    "id": replica_question_id,
+                    "question": "<replica_test>",
+                    "answer": "<replica_test>",
+                    "difficulty": 1,
+                    "category_id": category_id,
+                },
+            )
+            self.assertIsNone(Question.query.get(replica_question_id))
+            self.db.session.remove()
+
+            # Reads go to the healthy replica
+            client = app.test_client()
+            response = client.get(f"/questions/{replica_question_id}")
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn("ETag", response.headers)
+            self.assertFalse(
+                app.extensions["read_replicas"].replicas[0].healthy
+            )
+
+            # Writes go to the primary
+            response = client.post(
+                "/questions",
+                json={
+                    "question": "<replica_test>",
+                    "answer": "<replica_test>",
+                    "difficulty": 1,
+                    "category_id": category_id,
+                },
+            )
+            question_id = response.get_json()["new_question"]["id"]
+            self.assertIsNotNone(Question.query.get(question_id))
+            self.db.session.remove()
+
+            # Bodies read from a lagging replica aren't kept in memory,
+            # nor tagged with the ETag of the primary after the write
+            self.assertEqual(app.extensions["response_cache"]._bodies, {})
+
+            path = f"/categories/{category_id}/questions?length=1000"
+            response = app.test_client().get(path)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn("ETag", response.headers)
+            self.assertNotIn(
+                question_id,
+                [
+                    question["id"]
+                    for question in response.get_json()["questions"]
+                ],
+            )
+
+            etag = client.get(path).headers["ETag"]
+            response = app.test_client().get(
+                path, headers={"If-None-Match": etag}
+            )
+            self.assertEqual(response.status_code, 200)
+
+            # The writer reads its write from the primary, others don't yet
+            response = app.test_client().get(f"/questions/{question_id}")
+            self.assertEqual(response.status_code, 404)
+            response = client.get(f"/questions/{question_id}")
+            self.assertEqual(response.status_code, 200)
+
+            # Quiz questions drawn before the replica has them
+            # are fetched from the primary
+            previous_questions_ids = [
+                other_id
+                for other_id, in self.db.session.query(Question.id).filter(
+                    Question.category_id == category_id,
+                    Question.id != question_id,
+                )
+            ]
+            self.db.session.remove()
+            response = app.test_client().post(
+                "/quizzes",
+                json={
+                    "previous_questions_ids": previous_questions_ids,
+                    "quiz_category_id": category_id,
+                },
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(
+                response.get_json()["question"]["id"], question_id
+            )
+
+            response = client.delete(f"/questions/{question_id}")
+            self.assertEqual(response.status_code, 200)
+            self.assertIsNone(Question.query.get(question_id))
+
+            for engine in app.extensions["read_replicas"].engines():
+                engine.dispose()
+
+    def step_29_export(self):
+        response = self.client().get("/questions/export")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+
+        questions = [json.loads(line) for line in response.data.splitlines()]
+        ids = [question["id"] for question in questions]
+        self.assertEqual(len(questions), Question.query.count())
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(
+            questions[0],
+            with_category(Question.query).get(questions[0]["id"]).format(),
+        )
+
+        # Filtered by category and resumed after a question id
+        category_id = questions[-1]["category"]["id"]
+        response = self.client().get(
+            "/questions/export",
+            query_string={
+                "category_id": category_id,
+                "after": ids[0],
+                "max_id": ids[-1],
+            },
+        )
+        self.assertEqual(
+            [json.loads(line) for line in response.data.splitlines()],
+            [
+                question
+                for question in questions[1:]
+                if question["category"]["id"] == category_id
+            ],
+        )
+
+        # Gzipped on demand
+        response = self.client().get(
+            "/questions/export", headers={"Accept-Encoding": "gzip"}
+        )
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertEqual(
+            [
+                json.loads(line)
+                for line in gzip.decompress(response.data).splitlines()
+            ],
+            questions,
+        )
+
+        # Rows are read in batches
+        self.assertEqual(
+            [
+                len(batch)
+                for batch in stream_records(max_id=ids[2], batch_size=2)
+            ],
+            [2, 1],
+        )
+
+        self.check_status_404(
+            self.client().get("/questions/export?category_id=1000")
+        )
+
+        # Malformed filters are rejected rather than dropped
+        for name, value in [
+            ("category_id", "abc"),
+            ("max_id", "1O"),
+            ("after", "x"),
+        ]:
+            self.check_status_422(
+                self.client().get(
+                    "/questions/export", query_string={name: value}
+                )
+            )
+
+    def step_30_batch_read(self):
+        ids = [
+            question_id
+            for question_id, in self.db.session.query(Question.id)
+            .order_by(self.db.func.random())
+            .limit(3)
+        ]
+        missing_id = max(ids) + 1000
+        requested = [ids[2], missing_id, ids[0], ids[1], ids[0]]
+
+        response = self.client().get(
+            "/questions", query_string={"ids": ",".join(map(str, requested))}
+        )
+        data = response.get_json()
+
+        # Questions come in the requested order, with misses explicit
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            data["questions"],
+            [
+                (
+                    with_category(Question.query).get(question_id).format()
+                    if question_id != missing_id
+                    else None
+                )
+                for question_id in requested
+            ],
+        )
+        self.assertEqual(data["missing_ids"], [missing_id])
+
+        response = self.client().post("/questions", json={"ids": requested})
+        self.assertEqual(response.get_json(), data)
+
+        # All questions are fetched by a single query
+        self.assertEqual(
+            self.count_queries(
+                self.client().get, "/questions", query_string={"ids": "1,2,3"}
+            ),
+            1,
+        )
+
+        self.check_status_422(self.client().get("/questions?ids=1,a"))
+        self.check_status_422(
+            self.client().post("/questions", json={"ids": list(range(101))})
+        )
+
+    def step_31_batch_mutations(self):
+        category_id, to_category_id = [
+            category.id for category in Category.query.limit(2)
+        ]
+        ids = []
+
+        for _ in range(3):
+            question = Question(
+                question="<batch_test>",
+                answer="<batch_test>",
+                difficulty=1,
+                category_id=category_id,
+            )
+            question.add()
+            ids.append(question.id)
+
+        def total(category_id):
+            return (
+                self.client()
+                .get(f"/categories/{category_id}/questions")
+                .get_json()["total_questions"]
+            )
+
+        to_category_total = total(to_category_id)
+        version = versions[Question.__tablename__]
+
+        response = self.client().post(
+            "/questions/batch",
+            json={"action": "delete", "ids": ids, "dry_run": True},
+        )
+        self.assertEqual(response.get_json()["affected"], 3)
+        self.assertEqual(
+            Question.query.filter(Question.id.in_(ids)).count(), 3
+        )
+
+        response = self.client().post(
+            "/questions/batch",
+            json={
+                "action": "recategorize",
+                "ids": ids,
+                "to_category_id": to_category_id,
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["affected"], 3)
+
+        # Caches apply the whole batch as a single change
+        self.assertEqual(versions[Question.__tablename__], version + 1)
+        self.assertEqual(total(to_category_id), to_category_total + 3)
+
+        response = self.client().post(
+            "/questions/batch",
+            json={
+                "action": "delete",
+                "filter": {
+                    "category_id": to_category_id,
+                    "min_id": min(ids),
+                    "max_id": max(ids),
+                },
+            },
+        )
+        self.assertEqual(response.get_json()["affected"], 3)
+        self.assertEqual(versions[Question.__tablename__], version + 2)
+        self.assertEqual(total(to_category_id), to_category_total)
+        self.assertEqual(
+            Question.query.filter(Question.id.in_(ids)).count(), 0
+        )
+
+        # Deleted questions are gone
+        self.check_status_404(self.client().delete(f"/questions/{ids[0]}"))
+
+        for body in (
+            {"action": "delete"},
+            {"action": "truncate", "ids": ids},
+            {"action": "delete", "filter": {"question": "<batch_test>"}},
+            {"action": "recategorize", "ids": ids, "to_category_id": 1000},
+        ):
+            self.check_status_422(
+                self.client().post("/questions/batch", json=body)
+            )
+
+    def step_32_quiz_difficulty(self):
+        category_id = Category.query.first().id
+        ids = []
+
+        for difficulty in (1, 2, 2):
+            question = Question(
+                question="<difficulty_test>",
+                answer="<difficulty_test>",
+                difficulty=difficulty,
+                category_id=category_id,
+            )
+            question.add()
+            ids.append(question.id)
+
+        def play(**body):
+            return (
+                self.client()
+                .post(
+                    "/quizzes", json={"quiz_category_id": category_id, **body}
+                )
+                .get_json()["question"]
+            )
+
+        # A fixed difficulty plays every question of its bucket, then ends
+        played = []
+        question = play(previous_questions_ids=played, difficulty=2)
+
+        while question:
+            self.assertEqual(question["difficulty"], 2)
+            self.assertEqual(question["category"]["id"], category_id)
+            played.append(question["id"])
+            question = play(previous_questions_ids=played, difficulty=2)
+
+        self.assertEqual(
+            len(played),
+            Question.query.filter_by(
+                category_id=category_id, difficulty=2
+            ).count(),
+        )
+        self.assertTrue(set(ids[1:]).issubset(played))
+
+        # A ramp sets the difficulty by turn, keeping the last one
+        self.assertEqual(
+            play(previous_questions_ids=[], ramp=[1, 2])["difficulty"], 1
+        )
+        self.assertEqual(
+            play(previous_questions_ids=[ids[0]], ramp=[1, 2])["difficulty"],
+            2,
+        )
+        self.assertEqual(
+            play(previous_questions_ids=ids[:2], ramp=[1, 2])["difficulty"],
+            2,
+        )
+
+        # A turn still only fetches the drawn question
+        self.assertEqual(
+            self.count_queries(
+                self.client().post,
+                "/quizzes",
+                json={"previous_questions_ids": [], "ramp": [1, 2]},
+            ),
+            1,
+        )
+
+        # Buckets follow the changes of questions
+        question = Question.query.get(ids[0])
+        question.difficulty = 5
+        self.db.session.commit()
+        self.assertEqual(
+            play(previous_questions_ids=[], difficulty=5)["id"], ids[0]
+        )
+
+        for question_id in ids:
+            Question.query.get(question_id).delete()
+
+        self.assertFalse(play(previous_questions_ids=[], difficulty=5))
+
+        for body in (
+            {"difficulty": "hard"},
+            {"ramp": []},
+            {"ramp": [1, "2"]},
+            {"difficulty": 1, "ramp": [1, 2]},
+        ):
+            self.check_status_422(
+                self.client().post(
+                    "/quizzes", json={"previous_questions_ids": [], **body}
+                )
+            )
+
+    def step_33_question_snapshots(self):
+        category_id = Category.query.first().id
+
+        def total(**filters):
+            return Question.query.filter_by(**filters).count()
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "questions.snapshot")
+            app = create_app(
+                "flaskr/testing.py", {"QUESTION_SNAPSHOT_PATH": path}
+            )
+            client = app.test_client()
+            body = {
+                "previous_questions_ids": [],
+                "quiz_category_id": category_id,
+            }
+
+            # The first turn writes the snapshot, the next ones only
+            # fetch the drawn question
+            client.post("/quizzes", json=body)
+            self.assertIsNotNone(read_version(path))
+            self.assertEqual(
+                self.count_queries(
+                    client.post, "/quizzes", json=body, app=app
+                ),
+                1,
+            )
+
+            # Decks are shuffled from the snapshot and shared next to it
+            self.assertTrue(os.path.exists(f"{path}.decks"))
+            decks = DeckStore(SnapshotIndex(path), path=f"{path}.decks")
+            self.assertEqual(
+                sorted(decks.get()[category_id]),
+                sorted(SnapshotIndex(path).ids(category_id)),
+            )
+            self.assertIsInstance(decks.get()[category_id], memoryview)
+
+            # Other processes map the same snapshot
+            index = SnapshotIndex(path)
+            self.assertEqual(
+                index.count(category_id), total(category_id=category_id)
+            )
+            self.assertEqual(index.total(), total())
+            self.assertEqual(
+                client.post("/quizzes/sessions", json={}).get_json()[
+                    "total_questions"
+                ],
+                total(),
+            )
+
+            for (stratum_category_id, difficulty), ids in index.snapshot()[
+                1
+            ].items():
+                self.assertEqual(
+                    len(ids),
+                    total(
+                        category_id=stratum_category_id, difficulty=difficulty
+                    ),
+                )
+
+            question_id = index.pick(category_id)
+            self.assertTrue(index.contains(question_id, category_id))
+            self.assertFalse(index.contains(question_id, category_id + 1000))
+            self.assertIsNone(index.pick(category_id, index.ids(category_id)))
+
+            # The file is only replaced when questions have changed
+            version = index.version()
+            self.assertEqual(write_snapshot(path), (version, False))
+
+            question = Question(
+                question="<snapshot_test>",
+                answer="<snapshot_test>",
+                difficulty=1,
+                category_id=category_id,
+            )
+            question.add()
+            question_id = question.id
+
+            new_version, replaced = write_snapshot(path)
+            self.assertTrue(replaced)
+            self.assertEqual(index.version(), version)
+
+            # Requests swap in the replaced snapshot
+            index.check()
+            self.assertEqual(index.version(), new_version)
+            self.assertTrue(index.contains(question_id, category_id, 1))
+            self.assertEqual(
+                client.get(f"/categories/{category_id}/questions").get_json()[
+                    "total_questions"
+                ],
+                total(category_id=category_id),
+            )
+
+            # Questions deleted by this process are skipped by quiz turns
+            # until the snapshot is rewritten, which is done at once
+            # in the background
+            previous_questions_ids = [
+                other_id
+                for other_id in index.ids(category_id)
+                if other_id != question_id
+            ]
+            self.assertEqual(
+                client.delete(f"/questions/{question_id}").status_code, 200
+            )
+            response = client.post(
+                "/quizzes",
+                json={
+                    "previous_questions_ids": previous_questions_ids,
+                    "quiz_category_id": category_id,
+                },
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(response.get_json()["question"])
+
+            for _ in range(100):
+                if read_version(path) == version:
+                    break
+
+                time.sleep(0.05)
+
+            index.check()
+            self.assertEqual(index.version(), version)
+            self.assertFalse(index.contains(question_id))
+
+            # The refresher rewrites the snapshot every interval too
+            question = Question(
+                question="<snapshot_test>",
+                answer="<snapshot_test>",
+                difficulty=1,
+                category_id=category_id,
+            )
+            question.add()
+            question_id = question.id
+            refresher = SnapshotRefresher(app, path, interval=0.05)
+            refresher.start()
+
+            try:
+                for _ in range(100):
+                    if read_version(path) != version:
+                        break
+
+                    time.sleep(0.05)
+
+            finally:
+                refresher.stop()
+                question.delete()
+
+            index.check()
+            self.assertTrue(index.contains(question_id, category_id))
+
     def _steps(self):
-        for name in dir(self):
-            if name.startswith("step"):
-                yield name, getattr(self, name)
+        steps = [name for name in dir(self) if name.startswith("step")]
+
+        for name in sorted(steps, key=lambda name: int(name.split("_")[1])):
+            yield name, getattr(self, name)
 
     def test_steps(self):
         i = 1
@@ -283,6 +1751,94 @@ class TriviaTestCase(unittest.TestCase):
                 i += 1
 
 
+class ASGIClient:
+    """Sends requests of the Flask test client API through the ASGI app"""
+
+    def __init__(self, app, asgi_app):
+        self.app = app
+        self.asgi_app = asgi_app
+
+    async def send(self, scope, body):
+        messages = [{"type": "http.request", "body": body}]
+        response = {"body": b""}
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            if message["type"] == "http.response.body":
+                response["body"] += message["body"]
+
+            else:
+                response.update(message)
+
+        await self.asgi_app(scope, receive, send)
+        return response
+
+    def open(self, path, method="GET", **kwargs):
+        builder = EnvironBuilder(path=path, method=method, **kwargs)
+
+        try:
+            environ = builder.get_environ()
+
+        finally:
+            builder.close()
+
+        headers = [
+            (key[5:].replace("_", "-").lower().encode(), value.encode())
+            for key, value in environ.items()
+            if key.startswith("HTTP_")
+        ]
+
+        if environ.get("CONTENT_TYPE"):
+            headers.append((b"content-type", environ["CONTENT_TYPE"].encode()))
+
+        scope = {
+            "type": "http",
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": environ["PATH_INFO"],
+            "query_string": environ["QUERY_STRING"].encode(),
+            "headers": headers,
+        }
+        response = asyncio.run(self.send(scope, environ["wsgi.input"].read()))
+
+        # Requests run on sessions of other threads,
+        # so objects loaded by the test must be refreshed
+        db.session.expire_all()
+
+        return self.app.response_class(
+            response["body"],
+            status=response["status"],
+            headers=[
+                (name.decode(), value.decode())
+                for name, value in response["headers"]
+            ],
+        )
+
+    def get(self, *args, **kwargs):
+        return self.open(*args, method="GET", **kwargs)
+
+    def post(self, *args, **kwargs):
+        return self.open(*args, method="POST", **kwargs)
+
+    def patch(self, *args, **kwargs):
+        return self.open(*args, method="PATCH", **kwargs)
+
+    def delete(self, *args, **kwargs):
+        return self.open(*args, method="DELETE", **kwargs)
+
+
+class ASGITriviaTestCase(TriviaTestCase):
+    """Runs the trivia test case through the ASGI app"""
+
+    def setUp(self):
+        super().setUp()
+        asgi_app = WSGIToASGI(self.app, max_threads=4)
+        self.client = lambda: ASGIClient(self.app, asgi_app)
+
+
 # Make the tests conveniently executable
 if __name__ == "__main__":
     unittest.main()